@@ -0,0 +1,181 @@
+"""
+尺寸测量性能对比
+
+默认对同一批图片分别用全分辨率路径和金字塔粗检路径测量，报告每张耗时、加速比、
+对象数与全分辨率不一致的图片数，以及对象数一致的图片中测得尺寸的最大差异。
+未指定图片目录时分别用 2560x1920 的干净合成图片和纹理背景合成图片测试：
+干净背景上两条路径结果一致；纹理背景上粗检会漏掉或多出轮廓（Canny 滞后阈值的边缘连接不是局部的，
+粗检层也看不到细小的纹理轮廓），金字塔模式的精度应以纹理/实拍图片的结果为准。
+
+--suite 使用 size_synthetic 生成带真值的合成场景（干净 / 噪声+光照渐变 / 模糊 / 纹理背景），
+在多个分辨率下同时报告吞吐量（张/秒）和零件尺寸误差，参数或算法改动可以从速度和精度两方面评估。
+--truth 对已有图片目录（如 size_synthetic.py 生成的目录）按真值文件评估。
+
+用法:
+    python size_benchmark.py --input C:\\Users\\LHB\\Pictures\\OCR_Captures --levels 1 2
+    python size_benchmark.py --suite --resolutions 1280 2560 5120
+    python size_benchmark.py --input C:\\Users\\LHB\\Pictures\\Synthetic --truth C:\\Users\\LHB\\Pictures\\Synthetic\\ground_truth.json
+"""
+import os
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from size_object import MeasureParams, list_images, measure_image, read_image
+from size_synthetic import SceneSpec, dimension_errors, load_ground_truth, make_synthetic_scene, match_truth, truth_params
+
+# 精度测试场景：名称 → SceneSpec
+SUITE_SCENES = {
+    "干净": SceneSpec(noise_sigma=2),
+    "噪声+渐变": SceneSpec(noise_sigma=10, gradient=0.4),
+    "模糊": SceneSpec(noise_sigma=4, blur_mm=0.3),
+    "纹理背景": SceneSpec(noise_sigma=4, texture=12, texture_mm=0.2),
+}
+# 金字塔对比使用的纹理背景场景
+TEXTURED_SCENE = SUITE_SCENES["纹理背景"]
+
+
+def make_scene(width=2560, height=1920, parts=12, seed=0):
+    """生成合成测试图：最左侧方形参考物体 + 若干随机旋转矩形"""
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 225, np.uint8)
+    cv2.rectangle(image, (40, height // 2 - 80), (200, height // 2 + 80), (30, 30, 30), -1)
+    for _ in range(parts):
+        center = (float(rng.uniform(400, width - 200)), float(rng.uniform(200, height - 200)))
+        size = (float(rng.uniform(80, 300)), float(rng.uniform(80, 300)))
+        box = cv2.boxPoints((center, size, float(rng.uniform(0, 90))))
+        cv2.fillPoly(image, [box.astype(np.int32)], (40, 40, 40))
+    noise = rng.normal(0, 4, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+def time_measure(images, params, repeat=3):
+    """返回 (每张平均耗时秒, 最后一次的测量结果列表)"""
+    results = []
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [measure_image(img, params) for img in images]
+        best = min(best, time.perf_counter() - start)
+    return best / len(images), results
+
+def max_dimension_diff(results_a, results_b):
+    """
+    比较两组结果
+
+    Returns:
+        (对象数一致的图片中对应对象宽高的最大差值(mm)，无可比较图片时为None, 对象数不一致的图片数)
+    """
+    diff = None
+    mismatched = 0
+    for a, b in zip(results_a, results_b):
+        if len(a.records) != len(b.records):
+            mismatched += 1
+            continue
+        diff = diff or 0.0
+        if len(a.records):
+            diff = max(diff, np.abs(a.records["width_mm"] - b.records["width_mm"]).max(),
+                       np.abs(a.records["height_mm"] - b.records["height_mm"]).max())
+    return diff, mismatched
+
+def accuracy_summary(results, truths):
+    """
+    汇总一组测量结果相对真值的误差
+
+    Returns:
+        dict: detected/expected 零件数，mean/p95/max 为长短边绝对误差(mm)，bias 为平均带符号误差
+    """
+    errors = []
+    detected = expected = 0
+    for result, truth in zip(results, truths):
+        e, n, m = dimension_errors(match_truth(result, truth))
+        errors.append(e)
+        detected += n
+        expected += m
+    errors = np.concatenate(errors) if errors else np.zeros((0, 2))
+    abs_err = np.abs(errors).ravel()
+    if len(abs_err) == 0:
+        return {"detected": detected, "expected": expected, "mean": None, "p95": None, "max": None, "bias": None}
+    return {"detected": detected, "expected": expected, "mean": float(abs_err.mean()),
+            "p95": float(np.percentile(abs_err, 95)), "max": float(abs_err.max()), "bias": float(errors.mean())}
+
+def format_accuracy(summary):
+    rate = summary["detected"] / summary["expected"] if summary["expected"] else 0.0
+    if summary["mean"] is None:
+        return f"检出率 {rate:.1%}，无可比较零件"
+    return (f"检出率 {rate:.1%}，误差 平均 {summary['mean']:.3f} / P95 {summary['p95']:.3f} / "
+            f"最大 {summary['max']:.3f} mm，偏差 {summary['bias']:+.3f} mm")
+
+def run_suite(resolutions, scenes, params, repeat):
+    """合成场景精度+吞吐量测试，同一种子在各分辨率下为同一物理场景"""
+    for width in resolutions:
+        height = width * 3 // 4
+        for name, spec in SUITE_SCENES.items():
+            generated = [make_synthetic_scene(width, height, spec, seed=i) for i in range(scenes)]
+            images = [image for image, _ in generated]
+            t, results = time_measure(images, params, repeat)
+            summary = accuracy_summary(results, [truth for _, truth in generated])
+            print(f"{width}x{height} {name}: {1 / t:.2f} 张/秒 ({t * 1000:.1f} ms/张)，{format_accuracy(summary)}")
+
+def compare_pyramid(images, levels_list, repeat):
+    """全分辨率路径与各金字塔层数的耗时和结果差异"""
+    base_time, base_results = time_measure(images, MeasureParams(), repeat)
+    print(f"  全分辨率: {base_time * 1000:.1f} ms/张")
+    for levels in levels_list:
+        t, results = time_measure(images, MeasureParams(pyramid_levels=levels), repeat)
+        diff, mismatched = max_dimension_diff(base_results, results)
+        diff_text = "无可比较图片" if diff is None else f"{diff:.3f} mm"
+        print(f"  金字塔 {levels} 层: {t * 1000:.1f} ms/张，加速 {base_time / t:.2f}x，"
+              f"对象数不一致 {mismatched}/{len(images)} 张，其余最大尺寸差异 {diff_text}")
+
+def main():
+    parser = argparse.ArgumentParser(description='尺寸测量性能对比（全分辨率 vs 金字塔粗检）与合成真值精度测试')
+    parser.add_argument('--input', '-i', help='图片文件夹路径，默认使用合成图片')
+    parser.add_argument('--limit', type=int, default=20, help='最多使用的图片数量')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 2], help='要对比的金字塔层数')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    parser.add_argument('--suite', action='store_true', help='运行合成真值测试：多分辨率下的吞吐量与尺寸误差')
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[1280, 2560, 5120],
+                        help='--suite 测试的图片宽度（高度为宽度的3/4）')
+    parser.add_argument('--scenes', type=int, default=5, help='--suite 每种场景的图片数量')
+    parser.add_argument('--pyramid', type=int, default=0, help='--suite/--truth 使用的金字塔层数')
+    parser.add_argument('--truth', help='真值文件(ground_truth.json)，与 --input 一起使用时评估该目录图片的尺寸误差')
+    args = parser.parse_args()
+
+    if args.suite:
+        run_suite(args.resolutions, args.scenes, truth_params(pyramid_levels=args.pyramid), args.repeat)
+        return
+    if args.truth:
+        if not args.input:
+            parser.error("--truth 需要同时指定 --input")
+        truth = load_ground_truth(args.truth)
+        names = [fn for fn in sorted(list_images(args.input)) if fn in truth][:args.limit]
+        images = [read_image(os.path.join(args.input, fn)) for fn in names]
+        pairs = [(img, truth[fn]) for fn, img in zip(names, images) if img is not None]
+        if not pairs:
+            print("未找到带真值的可用图片")
+            return
+        t, results = time_measure([img for img, _ in pairs], truth_params(pyramid_levels=args.pyramid), args.repeat)
+        summary = accuracy_summary(results, [tr for _, tr in pairs])
+        print(f"图片数量: {len(pairs)}，{1 / t:.2f} 张/秒 ({t * 1000:.1f} ms/张)，{format_accuracy(summary)}")
+        return
+
+    if args.input:
+        paths = [os.path.join(args.input, fn) for fn in sorted(list_images(args.input))[:args.limit]]
+        image_sets = {args.input: [img for img in map(read_image, paths) if img is not None]}
+    else:
+        n = min(args.limit, 5)
+        image_sets = {"合成图片（干净背景）": [make_scene(seed=i) for i in range(n)],
+                      "合成图片（纹理背景）": [make_synthetic_scene(2560, 1920, TEXTURED_SCENE, seed=i)[0]
+                                               for i in range(n)]}
+    for name, images in image_sets.items():
+        if not images:
+            print("未找到可用图片")
+            return
+        h, w = images[0].shape[:2]
+        print(f"{name}: 图片数量 {len(images)}，尺寸 {w}x{h}")
+        compare_pyramid(images, args.levels, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+"""
+尺寸测量标定档案
+
+固定相机和治具时像素比例不会变化：用参考物体标定一次，保存为命名档案，
+之后 size_object.py 批处理直接复用，每帧不再查找参考物体。
+
+镜头畸变和相机倾斜同样每个工位只需离线标定一次：用棋盘格图片求出相机内参、
+畸变系数和治具平面的单应矩阵，合成为一组 remap 映射表缓存到磁盘，
+测量时每帧只做一次 cv2.remap。
+
+治具ROI：零件只会出现在画面中已知的窗口内，为每个工位定义矩形或多边形区域，
+测量时先裁剪到该区域再做模糊、边缘检测和轮廓查找，坐标再映射回原图。
+
+托盘布局：托盘上按网格摆放的零件，每个槽位一个矩形，测量结果按槽位归属输出，
+并报告空槽位和重复放置的槽位。
+
+用法:
+    python size_calibration.py --name station1 --board board_images --pattern 9x6
+    python size_calibration.py --name station1 --image ref.png --ref-width 2 --lens station1
+    python size_calibration.py --name station1 --roi-rect 100,80,1600,1200 --roi-poly "0,0;50,0;50,50"
+    python size_calibration.py --name tray1 --tray-grid 10x20 --tray-origin 300,120 --tray-pitch 110,95 --tray-slot 100,85
+    python size_calibration.py --list
+"""
+import os
+import sys
+import json
+import argparse
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+from size_object import MeasureParams, find_contours, list_images, measure_contours, read_image
+
+# 标定档案保存路径（命令行默认值）
+CALIBRATION_DIRECTORY = r"C:\Users\LHB\Pictures\Calibration_Profiles"
+
+
+@dataclass
+class CalibrationProfile:
+    """命名标定档案"""
+    name: str
+    pixel_per_cm: float          # 参考物体宽度对应的像素/cm
+    mm_scale: float              # 与 MeasureParams.mm_scale 含义相同
+    image_size: Tuple[int, int]  # 标定图像尺寸 (高, 宽)，测量图像必须一致
+    ref_width_cm: float
+    source_image: str = ""
+    created: str = ""
+
+
+def calibrate_reference(image, name, params=None, source_image=""):
+    """
+    在标定图像中查找最左侧参考物体并生成标定档案
+
+    Args:
+        image: BGR图像
+        name: 档案名称
+        params: MeasureParams，ref_width_cm 为参考物体已知宽度
+    Returns:
+        CalibrationProfile
+    Raises:
+        ValueError: 未找到参考物体
+    """
+    if params is None:
+        params = MeasureParams()
+    image_size = image.shape[:2]
+    cnts, areas = find_contours(image, params)
+    if len(cnts) == 0:
+        raise ValueError("未找到参考物体轮廓")
+    _, pixel_per_cm = measure_contours(cnts[:1], areas[:1], image_size, params)
+    if pixel_per_cm is None:
+        raise ValueError("参考物体尺寸为0")
+    return CalibrationProfile(
+        name=name,
+        pixel_per_cm=float(pixel_per_cm),
+        mm_scale=params.mm_scale,
+        image_size=tuple(int(v) for v in image_size),
+        ref_width_cm=params.ref_width_cm,
+        source_image=source_image,
+        created=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+def profile_path(name, profile_dir=CALIBRATION_DIRECTORY):
+    return os.path.join(profile_dir, f"{name}.json")
+
+def save_profile(profile, profile_dir=CALIBRATION_DIRECTORY):
+    """保存标定档案为JSON，返回文件路径"""
+    os.makedirs(profile_dir, exist_ok=True)
+    path = profile_path(profile.name, profile_dir)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(asdict(profile), f, ensure_ascii=False, indent=2)
+    return path
+
+def load_profile(name, profile_dir=CALIBRATION_DIRECTORY):
+    """
+    读取命名标定档案
+
+    Raises:
+        FileNotFoundError: 档案不存在
+    """
+    path = profile_path(name, profile_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"标定档案不存在: {path}")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data["image_size"] = tuple(data["image_size"])
+    return CalibrationProfile(**data)
+
+def list_profiles(profile_dir=CALIBRATION_DIRECTORY):
+    """标定档案名称列表（同一文件夹中的治具ROI _roi.json 和托盘布局 _tray.json 不是标定档案）"""
+    if not os.path.isdir(profile_dir):
+        return []
+    return sorted(fn[:-len('.json')] for fn in os.listdir(profile_dir)
+                  if fn.endswith('.json') and not fn.endswith(('_roi.json', '_tray.json')))
+
+@dataclass
+class LensCalibration:
+    """镜头畸变 + 治具平面透视校正，map1/map2 为 cv2.remap 使用的定点映射表"""
+    camera_matrix: np.ndarray
+    dist_coeffs: np.ndarray
+    homography: np.ndarray       # 去畸变像素坐标 → 校正后像素坐标
+    image_size: Tuple[int, int]  # (高, 宽)
+    rms: float                   # calibrateCamera 重投影误差(像素)
+    map1: np.ndarray
+    map2: np.ndarray
+
+
+def find_board_corners(image, pattern_size):
+    """查找棋盘格内角点并亚像素精化，未找到返回None"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    found, corners = cv2.findChessboardCorners(gray, pattern_size,
+                                               cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+
+def calibrate_lens(board_images, pattern_size=(9, 6)):
+    """
+    用多张棋盘格图片标定镜头，并以第一张图片中的棋盘格作为治具平面求透视校正。
+    第一张图片中的棋盘格必须平放在零件所在的治具平面上。
+
+    Args:
+        board_images: BGR图像列表，尺寸必须一致
+        pattern_size: 棋盘格内角点数 (列, 行)
+    Returns:
+        LensCalibration
+    Raises:
+        ValueError: 图片尺寸不一致或第一张图片未找到棋盘格
+    """
+    image_size = board_images[0].shape[:2]
+    grid = np.zeros((pattern_size[0] * pattern_size[1], 3), np.float32)
+    grid[:, :2] = np.mgrid[0:pattern_size[0], 0:pattern_size[1]].T.reshape(-1, 2)
+
+    object_points, image_points = [], []
+    for i, image in enumerate(board_images):
+        if image.shape[:2] != image_size:
+            raise ValueError("棋盘格图片尺寸不一致")
+        corners = find_board_corners(image, pattern_size)
+        if corners is None:
+            if i == 0:
+                raise ValueError("第一张图片未找到棋盘格，无法确定治具平面")
+            print(f"第{i + 1}张图片未找到棋盘格，已跳过")
+            continue
+        object_points.append(grid)
+        image_points.append(corners)
+
+    h, w = image_size
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(object_points, image_points, (w, h), None, None)
+
+    # 治具平面：去畸变后的角点 → 与之最接近的相似变换网格（保留平均尺度、方向和位置，只去掉透视）
+    undistorted = cv2.undistortPoints(image_points[0], camera_matrix, dist_coeffs, P=camera_matrix).reshape(-1, 2)
+    grid_2d = np.ascontiguousarray(grid[:, :2])
+    similarity, _ = cv2.estimateAffinePartial2D(grid_2d, undistorted)
+    target = grid_2d @ similarity[:, :2].T + similarity[:, 2]
+    homography, _ = cv2.findHomography(undistorted, target)
+
+    # 输出像素 (u,v) → 去畸变像素 H^-1(u,v) → 归一化坐标 (H·K)^-1(u,v) → 加畸变 → 原图像素
+    map1, map2 = cv2.initUndistortRectifyMap(camera_matrix, dist_coeffs, np.eye(3),
+                                             homography @ camera_matrix, (w, h), cv2.CV_16SC2)
+    return LensCalibration(camera_matrix, dist_coeffs, homography, image_size, float(rms), map1, map2)
+
+def lens_path(name, profile_dir=CALIBRATION_DIRECTORY):
+    return os.path.join(profile_dir, f"{name}_lens.npz")
+
+def save_lens_maps(lens, name, profile_dir=CALIBRATION_DIRECTORY):
+    """保存镜头标定和映射表（不压缩，加载快），返回文件路径"""
+    os.makedirs(profile_dir, exist_ok=True)
+    path = lens_path(name, profile_dir)
+    with open(path, 'wb') as f:
+        np.savez(f, camera_matrix=lens.camera_matrix, dist_coeffs=lens.dist_coeffs,
+                 homography=lens.homography, image_size=np.array(lens.image_size),
+                 rms=np.array(lens.rms), map1=lens.map1, map2=lens.map2)
+    return path
+
+def load_lens_maps(path):
+    """
+    读取镜头映射表文件
+
+    Raises:
+        FileNotFoundError: 文件不存在
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"镜头标定文件不存在: {path}")
+    with np.load(path) as data:
+        return LensCalibration(
+            camera_matrix=data["camera_matrix"],
+            dist_coeffs=data["dist_coeffs"],
+            homography=data["homography"],
+            image_size=tuple(int(v) for v in data["image_size"]),
+            rms=float(data["rms"]),
+            map1=data["map1"],
+            map2=data["map2"],
+        )
+
+def undistort_image(image, lens):
+    """用预先计算的映射表一次 remap 完成去畸变和透视校正"""
+    if image.shape[:2] != tuple(lens.image_size):
+        raise ValueError("图像尺寸与镜头标定不一致")
+    return cv2.remap(image, lens.map1, lens.map2, cv2.INTER_LINEAR)
+
+def corrected_to_raw(points, lens):
+    """
+    校正后图像中的像素坐标 → 原图像素坐标（形状 (...,2)）。remap 映射表记录的正是每个输出像素在原图中的采样位置，
+    直接按最近的输出像素查表，定点映射表的小数部分精度为 1/INTER_TAB_SIZE 像素
+    """
+    pts = np.rint(np.asarray(points, dtype=np.float64)).astype(np.intp)
+    h, w = lens.map1.shape[:2]
+    x = np.clip(pts[..., 0], 0, w - 1)
+    y = np.clip(pts[..., 1], 0, h - 1)
+    raw = lens.map1[y, x].astype(np.float64)
+    if lens.map2 is not None and lens.map2.ndim == 2 and lens.map1.ndim == 3:
+        # CV_16SC2 定点映射：map1 为整数部分，map2 低 INTER_BITS 位为x小数、高位为y小数的插值表索引
+        frac = lens.map2[y, x].astype(np.intp)
+        raw[..., 0] += (frac & (cv2.INTER_TAB_SIZE - 1)) / cv2.INTER_TAB_SIZE
+        raw[..., 1] += (frac >> cv2.INTER_BITS) / cv2.INTER_TAB_SIZE
+    elif lens.map1.ndim == 2:
+        # CV_32FC1：map1、map2 分别为x、y坐标
+        raw = np.stack([lens.map1[y, x], lens.map2[y, x]], axis=-1).astype(np.float64)
+    return raw
+
+@dataclass
+class FixtureROI:
+    """
+    治具ROI，由若干多边形组成（矩形也存为4点多边形）。
+    测量时裁剪到所有多边形的外接矩形；多边形未填满该矩形时，
+    只保留多边形内的边缘（屏蔽的是边缘图而不是原图，不会在ROI边界产生假边缘）
+    """
+    polygons: List[List[Tuple[int, int]]]
+    _masks: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_rects(cls, rects):
+        return cls([[(x, y), (x + w, y), (x + w, y + h), (x, y + h)] for x, y, w, h in rects])
+
+    def crop(self, image_size):
+        """
+        Returns:
+            ((x0, y0, x1, y1) 裁剪范围, 裁剪范围内的uint8掩膜；ROI即为矩形时掩膜为None)
+        """
+        key = tuple(image_size[:2])
+        if key not in self._masks:
+            h, w = key
+            pts = [np.array(poly, dtype=np.int32).reshape(-1, 2) for poly in self.polygons]
+            all_pts = np.concatenate(pts)
+            x0, y0 = np.clip(all_pts.min(axis=0), 0, [w, h])
+            x1, y1 = np.clip(all_pts.max(axis=0), 0, [w, h])
+            bounds = (int(x0), int(y0), int(x1), int(y1))
+            mask = np.zeros((bounds[3] - bounds[1], bounds[2] - bounds[0]), np.uint8)
+            # 逐个填充：一次 fillPoly 多个多边形时按奇偶规则，重叠部分会被挖空
+            for p in pts:
+                cv2.fillPoly(mask, [p - [x0, y0]], 255)
+            self._masks[key] = (bounds, None if mask.all() else mask)
+        return self._masks[key]
+
+def roi_path(name, profile_dir=CALIBRATION_DIRECTORY):
+    return os.path.join(profile_dir, f"{name}_roi.json")
+
+def save_roi(roi, name, profile_dir=CALIBRATION_DIRECTORY):
+    os.makedirs(profile_dir, exist_ok=True)
+    path = roi_path(name, profile_dir)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"polygons": [[list(map(int, pt)) for pt in poly] for poly in roi.polygons]}, f)
+    return path
+
+def load_roi(name, profile_dir=CALIBRATION_DIRECTORY):
+    """
+    读取工位ROI定义
+
+    Raises:
+        FileNotFoundError: 文件不存在
+    """
+    path = roi_path(name, profile_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ROI定义不存在: {path}")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return FixtureROI([[tuple(pt) for pt in poly] for poly in data["polygons"]])
+
+@dataclass
+class TrayLayout:
+    """
+    托盘槽位布局，每个槽位为一个矩形 (x, y, w, h)。
+    槽位查找使用按 cell 像素缩小的标签栅格作为空间索引：每个点只查一次栅格，
+    耗时与槽位数量无关，几百个零件对几百个槽位也不需要逐一比较
+    """
+    names: List[str]
+    rects: List[Tuple[int, int, int, int]]
+    cell: int = 4
+    _index: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_grid(cls, rows, cols, origin, pitch, slot_size):
+        """规则网格：origin 为第一个槽位左上角，pitch 为相邻槽位间距 (dx, dy)，槽位名 R01C01 按行列编号"""
+        names, rects = [], []
+        for r in range(rows):
+            for c in range(cols):
+                names.append(f"R{r + 1:02d}C{c + 1:02d}")
+                rects.append((origin[0] + c * pitch[0], origin[1] + r * pitch[1], slot_size[0], slot_size[1]))
+        return cls(names, rects)
+
+    def slot_index(self, image_size):
+        """缩小 cell 倍的槽位标签栅格，值为槽位序号，-1 表示不属于任何槽位"""
+        key = tuple(image_size[:2])
+        if key not in self._index:
+            h, w = key
+            cell = self.cell
+            index = np.full(((h + cell - 1) // cell, (w + cell - 1) // cell), -1, np.int32)
+            for i, (x, y, rw, rh) in enumerate(self.rects):
+                x0, y0 = max(0, x), max(0, y)
+                x1, y1 = min(w, x + rw), min(h, y + rh)
+                if x1 > x0 and y1 > y0:
+                    index[y0 // cell:(y1 - 1) // cell + 1, x0 // cell:(x1 - 1) // cell + 1] = i
+            self._index[key] = index
+        return self._index[key]
+
+    def assign(self, points, image_size):
+        """
+        Args:
+            points: (N, 2) 像素坐标
+        Returns:
+            (N,) 槽位序号，-1 表示不在任何槽位内
+        """
+        index = self.slot_index(image_size)
+        pts = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        h, w = image_size[:2]
+        inside = (pts[:, 0] >= 0) & (pts[:, 0] < w) & (pts[:, 1] >= 0) & (pts[:, 1] < h)
+        slots = np.full(len(pts), -1, np.int32)
+        slots[inside] = index[pts[inside, 1] // self.cell, pts[inside, 0] // self.cell]
+        return slots
+
+def tray_path(name, profile_dir=CALIBRATION_DIRECTORY):
+    return os.path.join(profile_dir, f"{name}_tray.json")
+
+def save_tray(tray, name, profile_dir=CALIBRATION_DIRECTORY):
+    os.makedirs(profile_dir, exist_ok=True)
+    path = tray_path(name, profile_dir)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"names": tray.names, "rects": [list(map(int, r)) for r in tray.rects]}, f, ensure_ascii=False)
+    return path
+
+def load_tray(name, profile_dir=CALIBRATION_DIRECTORY):
+    """
+    读取托盘布局
+
+    Raises:
+        FileNotFoundError: 文件不存在
+    """
+    path = tray_path(name, profile_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"托盘布局不存在: {path}")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return TrayLayout(data["names"], [tuple(r) for r in data["rects"]])
+
+def main():
+    parser = argparse.ArgumentParser(description='参考物体标定档案管理')
+    parser.add_argument('--name', '-n', help='档案名称')
+    parser.add_argument('--image', '-i', help='包含参考物体（最左侧）的标定图片')
+    parser.add_argument('--board', '-b', help='棋盘格图片文件夹，指定时标定镜头并保存映射表')
+    parser.add_argument('--pattern', default='9x6', help='棋盘格内角点数（列x行），默认9x6')
+    parser.add_argument('--lens', help='参考物体标定前先用该名称的镜头映射表校正图片')
+    parser.add_argument('--roi-rect', action='append', default=[], help='治具ROI矩形 x,y,w,h，可重复指定')
+    parser.add_argument('--roi-poly', action='append', default=[], help='治具ROI多边形 "x1,y1;x2,y2;..."，可重复指定')
+    parser.add_argument('--tray-grid', help='托盘槽位网格 行x列，如 10x20')
+    parser.add_argument('--tray-origin', help='第一个槽位左上角像素坐标 x,y')
+    parser.add_argument('--tray-pitch', help='相邻槽位间距(像素) dx,dy')
+    parser.add_argument('--tray-slot', help='槽位大小(像素) w,h，默认等于间距')
+    parser.add_argument('--ref-width', type=float, default=MeasureParams.ref_width_cm,
+                        help='参考物体已知宽度(cm)，默认2')
+    parser.add_argument('--dir', '-d', default=CALIBRATION_DIRECTORY, help='档案文件夹路径')
+    parser.add_argument('--list', '-l', action='store_true', help='列出已保存的档案')
+    args = parser.parse_args()
+
+    if args.list:
+        for name in list_profiles(args.dir):
+            try:
+                profile = load_profile(name, args.dir)
+            except (KeyError, TypeError, ValueError):
+                # 文件夹中的其他JSON文件（如合成图片的 ground_truth.json）
+                continue
+            print(f"{name}: {profile.pixel_per_cm:.3f} 像素/cm, 图像尺寸 {profile.image_size}, 创建于 {profile.created}")
+        return
+
+    if args.roi_rect or args.roi_poly:
+        if not args.name:
+            parser.error("定义ROI需要指定 --name")
+        rects = [tuple(int(v) for v in text.split(',')) for text in args.roi_rect]
+        polygons = [[tuple(int(v) for v in pt.split(',')) for pt in text.split(';')] for text in args.roi_poly]
+        roi = FixtureROI(FixtureROI.from_rects(rects).polygons + polygons)
+        path = save_roi(roi, args.name, args.dir)
+        print(f"ROI定义已保存到: {path}")
+        return
+
+    if args.tray_grid:
+        if not args.name or not args.tray_origin or not args.tray_pitch:
+            parser.error("定义托盘需要指定 --name、--tray-origin 和 --tray-pitch")
+        rows, cols = (int(v) for v in args.tray_grid.lower().split('x'))
+        origin = tuple(int(v) for v in args.tray_origin.split(','))
+        pitch = tuple(int(v) for v in args.tray_pitch.split(','))
+        slot_size = tuple(int(v) for v in args.tray_slot.split(',')) if args.tray_slot else pitch
+        path = save_tray(TrayLayout.from_grid(rows, cols, origin, pitch, slot_size), args.name, args.dir)
+        print(f"托盘布局已保存到: {path} ({rows}x{cols} 个槽位)")
+        return
+
+    if args.board:
+        if not args.name:
+            parser.error("镜头标定需要指定 --name")
+        pattern_size = tuple(int(v) for v in args.pattern.lower().split('x'))
+        images = [read_image(os.path.join(args.board, fn)) for fn in sorted(list_images(args.board))]
+        images = [img for img in images if img is not None]
+        if not images:
+            print(f"未找到棋盘格图片: {args.board}")
+            sys.exit(1)
+        try:
+            lens = calibrate_lens(images, pattern_size)
+        except ValueError as e:
+            print(f"镜头标定失败: {e}")
+            sys.exit(1)
+        path = save_lens_maps(lens, args.name, args.dir)
+        print(f"镜头映射表已保存到: {path} (重投影误差 {lens.rms:.3f} 像素)")
+        return
+
+    if not args.name or not args.image:
+        parser.error("标定需要同时指定 --name 和 --image")
+
+    image = read_image(args.image)
+    if image is None:
+        print(f"无法读取图像: {args.image}")
+        sys.exit(1)
+    if args.lens:
+        image = undistort_image(image, load_lens_maps(lens_path(args.lens, args.dir)))
+    try:
+        profile = calibrate_reference(image, args.name, MeasureParams(ref_width_cm=args.ref_width),
+                                      source_image=os.path.abspath(args.image))
+    except ValueError as e:
+        print(f"标定失败: {e}")
+        sys.exit(1)
+    path = save_profile(profile, args.dir)
+    print(f"标定档案已保存到: {path} ({profile.pixel_per_cm:.3f} 像素/cm)")
+
+if __name__ == "__main__":
+    main()
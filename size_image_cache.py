@@ -0,0 +1,233 @@
+"""
+参数扫描用的图片解码缓存
+
+test_param_combinations.py 对每个参数组合都要遍历同一批图片，每张图片只在这里解码一次，
+所有组合共用。解码后的总大小不超过 memory_limit 时BGR图像保存在内存中；
+超过时改为灰度图顺序写入 cache_dir 下的一个原始文件，再用 np.memmap 只读映射，
+由操作系统按需换入换出，内存占用不随图片数量增长。
+
+    cache = ImageCache(paths, memory_limit=4 << 30)
+    for name in cache.names:
+        image = cache.get(name)      # BGR（内存模式）或灰度图（memmap模式），只读使用
+    cache.close()
+
+多进程扫描时主进程调用 share()：内存模式的图像移入一块 multiprocessing.shared_memory 共享内存，
+memmap 模式直接共享缓存文件；工作进程用 ImageCache.attach(handle) 映射同一份数据，不复制图像。
+"""
+import os
+import tempfile
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from size_object import read_image
+
+
+@dataclass
+class SharedCacheHandle:
+    """工作进程映射共享缓存所需的信息（可序列化）"""
+    mode: str
+    names: List[str]
+    errors: Dict[str, str]
+    layout: Dict[str, Tuple[int, Tuple[int, ...]]]  # 文件名 → (偏移, 形状)
+    shm_name: Optional[str] = None                   # 内存模式的共享内存名称
+    path: Optional[str] = None                       # memmap 模式的缓存文件
+
+
+def _attach_shared_memory(name):
+    """映射已有的共享内存（由创建者负责释放）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前没有 track 参数。进程池的工作进程与主进程共用同一个 resource_tracker，
+        # 重复登记不会导致共享内存被提前删除
+        return shared_memory.SharedMemory(name=name)
+
+
+class ImageCache:
+    """
+    解码一次的图片缓存
+
+    Args:
+        paths: 图片路径列表，按文件名索引（同名文件只保留第一个）
+        memory_limit: 内存模式允许的解码后总字节数
+        cache_dir: memmap 文件所在文件夹，默认系统临时目录
+        progress: 可选的迭代包装（如 tqdm），用于显示解码进度
+    """
+    def __init__(self, paths, memory_limit=4 << 30, cache_dir=None, progress=None):
+        self.memory_limit = memory_limit
+        self.cache_dir = cache_dir or tempfile.gettempdir()
+        self.mode = "memory"
+        self.names = []
+        self.errors = {}        # 文件名 → 读取失败原因
+        self.images = {}        # 内存模式：文件名 → BGR图像
+        self.offsets = {}       # memmap模式：文件名 → (偏移, 高, 宽)
+        self.path = None
+        self.mm = None
+        self.shm = None
+        self._owner = True      # 创建者负责删除 memmap 文件和共享内存
+        self._file = None
+        self._nbytes = 0
+
+        paths = list(paths)
+        for image_path in (progress(paths) if progress else paths):
+            name = os.path.basename(image_path)
+            if name in self.errors or name in self.images or name in self.offsets:
+                continue
+            self.names.append(name)
+            image = read_image(image_path)
+            if image is None:
+                self.errors[name] = "无法读取图像"
+                continue
+            if self.mode == "memory" and self._nbytes + image.nbytes > memory_limit:
+                self._spill()
+            if self.mode == "memory":
+                self.images[name] = image
+                self._nbytes += image.nbytes
+            else:
+                self._append_gray(name, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            if self._nbytes:
+                self.mm = np.memmap(self.path, dtype=np.uint8, mode='r')
+
+    def _spill(self):
+        """切换到 memmap 模式：已缓存的图片转为灰度写入磁盘"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="sweep_gray_", suffix=".u8", dir=self.cache_dir)
+        self._file = os.fdopen(fd, 'wb')
+        self.mode = "memmap"
+        images, self.images = self.images, {}
+        self._nbytes = 0
+        for name, image in images.items():
+            self._append_gray(name, cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+
+    def _append_gray(self, name, gray):
+        h, w = gray.shape
+        self.offsets[name] = (self._nbytes, h, w)
+        self._file.write(np.ascontiguousarray(gray).tobytes())
+        self._nbytes += h * w
+
+    def share(self):
+        """
+        准备供工作进程共享：内存模式下把图像复制进一块共享内存，本进程也改用共享内存中的视图
+        （不保留两份）；memmap 模式直接共享缓存文件。
+
+        Returns:
+            SharedCacheHandle，传给工作进程的 ImageCache.attach()
+        """
+        if self.mode == "memmap":
+            layout = {name: (offset, (h, w)) for name, (offset, h, w) in self.offsets.items()}
+            return SharedCacheHandle("memmap", self.names, self.errors, layout, path=self.path)
+        if self.shm is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(1, self._nbytes))
+            offset = 0
+            images = {}
+            for name, image in self.images.items():
+                view = np.ndarray(image.shape, np.uint8, buffer=self.shm.buf, offset=offset)
+                view[...] = image
+                images[name] = view
+                offset += image.nbytes
+            self.images = images
+        layout = {}
+        offset = 0
+        for name, image in self.images.items():
+            layout[name] = (offset, image.shape)
+            offset += image.nbytes
+        return SharedCacheHandle("memory", self.names, self.errors, layout, shm_name=self.shm.name)
+
+    @classmethod
+    def attach(cls, handle):
+        """在工作进程中按 share() 返回的 handle 映射同一份缓存（只读使用）"""
+        cache = cls.__new__(cls)
+        cache.memory_limit = 0
+        cache.cache_dir = None
+        cache.mode = handle.mode
+        cache.names = list(handle.names)
+        cache.errors = dict(handle.errors)
+        cache.images = {}
+        cache.offsets = {}
+        cache.path = handle.path
+        cache.mm = None
+        cache.shm = None
+        cache._owner = False
+        cache._file = None
+        cache._nbytes = 0
+        if handle.mode == "memmap":
+            for name, (offset, (h, w)) in handle.layout.items():
+                cache.offsets[name] = (offset, h, w)
+                cache._nbytes += h * w
+            if cache._nbytes:
+                cache.mm = np.memmap(handle.path, dtype=np.uint8, mode='r')
+        else:
+            cache.shm = _attach_shared_memory(handle.shm_name)
+            for name, (offset, shape) in handle.layout.items():
+                cache.images[name] = np.ndarray(shape, np.uint8, buffer=cache.shm.buf, offset=offset)
+                cache._nbytes += int(np.prod(shape))
+        return cache
+
+    @property
+    def nbytes(self):
+        """缓存的解码数据总字节数"""
+        return self._nbytes
+
+    def __len__(self):
+        return len(self.names)
+
+    def error(self, name):
+        """读取失败原因，成功时返回None"""
+        return self.errors.get(name)
+
+    def get(self, name):
+        """
+        缓存的图像（调用方不得修改）：内存模式为BGR，memmap模式为灰度；读取失败返回None。
+        detect_edges 可直接接受两种图像
+        """
+        if name in self.errors:
+            return None
+        if self.mode == "memory":
+            return self.images[name]
+        offset, h, w = self.offsets[name]
+        return self.mm[offset:offset + h * w].reshape(h, w)
+
+    def color(self, name):
+        """用于绘制标注的BGR副本（memmap模式下由灰度图转换）"""
+        image = self.get(name)
+        if image is None:
+            return None
+        return image.copy() if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+    def close(self):
+        """释放缓存；创建者同时删除 memmap 文件和共享内存"""
+        self.images = {}
+        self.mm = None
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                # 仍有外部引用的视图时无法解除映射，进程退出时由系统回收
+                pass
+            if self._owner:
+                self.shm.unlink()
+            self.shm = None
+        if not self._owner:
+            self.path = None
+            return
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                # Windows 下仍有映射视图未释放时无法删除，留在临时目录
+                pass
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
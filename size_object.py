@@ -1,16 +1,141 @@
 """
 Filename: init.py
-Usage: This script will measure different objects in the frame using a reference object of known dimension. 
+Usage: This script will measure different objects in the frame using a reference object of known dimension.
 The object with known dimension must be the leftmost object.
+
+作为模块导入时没有任何副作用，可直接调用 measure_image() 对内存中的BGR图像进行测量；
+作为脚本运行时遍历图片目录，保存标注图片并写入结果文件。
 """
-from scipy.spatial.distance import euclidean
-from imutils import perspective
-from imutils import contours
 import numpy as np
 import imutils
 import cv2
 import os
+import sys
+import json
+import hashlib
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime
+from functools import lru_cache
+from itertools import repeat
+from html import escape
+from typing import List, Optional, Tuple
+
+from size_results import RESULT_FORMATS, RunManifest, file_hash, open_result_writer
+from size_stats import ImageStats, RunStats, count, finish_image, stage, start_image
+from size_writer import IMAGE_FORMATS, ImageWriter, SyncImageWriter, write_image
+
+# 图片读取和保存相关路径（命令行默认值）
+IMAGE_DIRECTORY = r"C:\Users\LHB\Pictures\OCR_Captures"
+PROCESSED_DIRECTORY = r"C:\Users\LHB\Pictures\Processed_Images"
+RESULTS_DIRECTORY = r"C:\Users\LHB\Pictures\OCR_Results"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# 标注图片保存方式：全部 / 不保存（只测量）/ 只保存失败图片 / 每隔N张抽样保存
+ANNOTATE_MODES = ("all", "none", "failures", "sample")
+# 标注输出格式：烧录到JPEG图片 / 矢量标注文件（不复制、不重新编码原图）
+OVERLAY_FORMATS = ("jpg", "json", "svg")
+# 画面质量预检查使用的缩小图宽度
+PRECHECK_WIDTH = 640
+# OpenCV 5.x 的 boxPoints 直接计算全部四个角点，见 rects_to_boxes
+_BOXPOINTS_DIRECT = int(cv2.__version__.split(".")[0]) >= 5
+
+
+@dataclass
+class MeasureParams:
+    """测量流程参数"""
+    blur_ksize: int = 9         # 高斯模糊核大小参数 (9, 9)
+    canny_low: int = 50         # Canny边缘检测阈值参数 50, 100
+    canny_high: int = 100
+    dilate_iter: int = 1        # 膨胀迭代次数参数 1
+    erode_iter: int = 1         # 腐蚀迭代次数参数 1
+    min_area: float = 100       # 轮廓面积阈值参数 100
+    ref_width_cm: float = 2     # 参考物体(最左侧)的已知宽度(cm)
+    mm_scale: float = 20.6      # 放大20.6倍，单位改为mm
+    pyramid_levels: int = 0     # >0 时在缩小2^n倍的图像上找候选轮廓，再在全分辨率ROI内精化
+    refine_margin: int = 16     # 精化ROI相对候选框向外扩展的像素数（全分辨率）
+    pyramid_max_roi: float = 0.5  # 精化ROI总面积超过整图该比例时（纹理背景候选过多）改用全分辨率路径
+    precheck: bool = False      # 测量前快速检查画面质量，模糊、空白、过曝、过暗的画面直接拒绝
+    min_sharpness: float = 30   # 拉普拉斯方差下限（在宽 PRECHECK_WIDTH 的缩小图上计算）
+    min_contrast: float = 8     # 灰度标准差下限，低于该值视为空治具/空白画面
+    min_brightness: float = 30  # 平均灰度下限
+    max_brightness: float = 240 # 平均灰度上限
+    max_saturated: float = 0.25 # 饱和像素(>=250)占比上限
+    tile_size: int = 0          # >0 时按该边长分块做边缘检测和轮廓提取（超大扫描图），中间结果内存与块大小相关
+
+
+# 向量化测量结果的结构化数组类型，每行对应一个轮廓
+MEASUREMENT_DTYPE = np.dtype([
+    ("index", np.int32),
+    ("width_mm", np.float64),
+    ("height_mm", np.float64),
+    ("angle", np.float64),          # 以Y轴为基准的偏转角度(度)
+    ("confidence", np.float64),
+    ("box", np.int32, (4, 2)),      # 角点顺序为 tl, tr, br, bl
+])
+
+
+@dataclass
+class ObjectMeasurement:
+    """单个轮廓的测量结果"""
+    index: int
+    width_mm: float
+    height_mm: float
+    angle: float                # 以Y轴为基准的偏转角度(度)
+    confidence: float
+    box: np.ndarray             # 4x2 角点，顺序为 tl, tr, br, bl
+
+
+@dataclass
+class SlotAssignment:
+    """托盘模式的槽位分配结果"""
+    slots: List[Optional[str]]  # 每个测量对象所在槽位名称，None 表示不在任何槽位内（含参考物体）
+    empty: List[str]            # 没有零件的槽位
+    double: List[str]           # 有两个及以上零件的槽位
+    unassigned: int = 0         # 不在任何槽位内的零件数（不含参考物体）
+
+
+@dataclass
+class ImageMeasurement:
+    """
+    单张图片的测量结果，error 非空表示测量失败；records 为 MEASUREMENT_DTYPE 结构化数组。
+    rejected 为 True 表示画面未通过质量预检查（未做轮廓检测），error 为拒绝原因；
+    stats 为开启分阶段统计时该图片的各阶段耗时和计数 (size_stats.ImageStats)；
+    tray 为托盘模式下的槽位分配 (SlotAssignment)；
+    reference 为 True 表示 records 第一行是参考物体（未使用标定档案），parts 不含该行
+    """
+    image_size: Tuple[int, int]
+    pixel_per_cm: Optional[float] = None
+    records: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=MEASUREMENT_DTYPE))
+    error: Optional[str] = None
+    rejected: bool = False
+    stats: Optional[ImageStats] = None
+    tray: Optional[SlotAssignment] = None
+    reference: bool = False
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def status(self):
+        """"ok" / "rejected"（预检查拒绝）/ "failed"（检测或读取失败）"""
+        if self.ok:
+            return "ok"
+        return "rejected" if self.rejected else "failed"
+
+    @property
+    def objects(self) -> List[ObjectMeasurement]:
+        return [ObjectMeasurement(int(r["index"]), float(r["width_mm"]), float(r["height_mm"]),
+                                  float(r["angle"]), float(r["confidence"]), r["box"].copy())
+                for r in self.records]
+
+    @property
+    def parts(self) -> np.ndarray:
+        """零件的测量记录（不含参考物体）"""
+        return self.records[1:] if self.reference else self.records
+
 
 # Function to show array of images (intermediate results)
 def show_images(images):
@@ -19,145 +144,1217 @@ def show_images(images):
 	cv2.waitKey(0)
 	cv2.destroyAllWindows()
 
-def save_image(image, save_path):
+def save_image(image, save_path, fmt="jpg", quality=None):
+    """同步编码写入图片（fmt 见 size_writer.IMAGE_FORMATS），成功返回True"""
     try:
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        is_success, buffer = cv2.imencode(".jpg", image)
-        if is_success:
-            with open(save_path, "wb") as f:
-                f.write(buffer.tobytes())
-        return is_success
+        with stage("encode_write"):
+            size = write_image(image, save_path, fmt, quality)
+        if size is not None:
+            count("bytes_written", size)
+        return size is not None
     except Exception as e:
         print(f"保存图像时出错: {save_path}")
         print(f"错误信息: {str(e)}")
         return False
 
-# 图片读取和保存相关路径
-image_directory = r"C:\Users\LHB\Pictures\OCR_Captures"
-processed_dir = r"C:\Users\LHB\Pictures\Processed_Images"
-
-# 生成结果文件名（使用时间戳）
-results_directory = r"C:\Users\LHB\Pictures\OCR_Results"
-if not os.path.exists(results_directory):
-    os.makedirs(results_directory)
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-result_file = os.path.join(results_directory, f"detection_results_{timestamp}.txt")
-
-# 遍历图片目录，处理每张图片
-with open(result_file, 'w', encoding='utf-8') as f:
-    for filename in os.listdir(image_directory):
-        if filename.endswith(('.png', '.jpg', '.jpeg')):
-            image_path = os.path.join(image_directory, filename)
-            # 用imdecode方式读取图片，支持中文路径
-            try:
-                image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
-            except Exception as e:
-                print(f"读取图像时出错: {image_path}")
-                print(f"错误信息: {str(e)}")
+def read_image(image_path):
+    """用imdecode方式读取图片，支持中文路径；失败返回None"""
+    try:
+        return cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except Exception as e:
+        print(f"读取图像时出错: {image_path}")
+        print(f"错误信息: {str(e)}")
+        return None
+
+def check_frame(image, params):
+    """
+    画面质量预检查：在缩小到 PRECHECK_WIDTH 宽的灰度图上计算平均亮度、饱和像素占比、
+    灰度标准差和拉普拉斯方差，5MP图片约几毫秒
+
+    Returns:
+        拒绝原因；画面可用时返回None
+    """
+    h, w = image.shape[:2]
+    if w > PRECHECK_WIDTH:
+        # 最近邻抽样即可，比 INTER_AREA 快得多
+        image = cv2.resize(image, (PRECHECK_WIDTH, max(1, round(h * PRECHECK_WIDTH / w))),
+                           interpolation=cv2.INTER_NEAREST)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    mean, std = cv2.meanStdDev(gray)
+    mean, std = float(mean[0, 0]), float(std[0, 0])
+    if mean < params.min_brightness:
+        return "画面过暗"
+    if mean > params.max_brightness or cv2.countNonZero(cv2.inRange(gray, 250, 255)) > params.max_saturated * gray.size:
+        return "画面过曝"
+    if std < params.min_contrast:
+        return "画面空白"
+    sharpness = float(cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_64F))[1][0, 0]) ** 2
+    if sharpness < params.min_sharpness:
+        return "画面模糊"
+    return None
+
+# 置信度计算（向量化）：多边形近似顶点数在4~8之间得0.6，面积占比0.1~0.9加0.2，恰为四边形再加0.2
+def calculate_confidences(areas, complexities, image_size):
+    area_ratio = areas / (image_size[0] * image_size[1])
+    confidence = np.where((complexities >= 4) & (complexities <= 8), 0.6, 0.0)
+    confidence += np.where((confidence > 0) & (area_ratio >= 0.1) & (area_ratio <= 0.9), 0.2, 0.0)
+    confidence += np.where((confidence > 0) & (complexities == 4), 0.2, 0.0)
+    return np.minimum(confidence, 1.0)
+
+def detect_edges(image, params, blur_ksize=None):
+    """灰度 → 高斯模糊 → Canny → 膨胀/腐蚀，返回边缘图（输入可为BGR或灰度图）"""
+    with stage("gray_blur"):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        ksize = blur_ksize or params.blur_ksize
+        blur = cv2.GaussianBlur(gray, (ksize, ksize), 0)
+    with stage("canny"):
+        edged = cv2.Canny(blur, params.canny_low, params.canny_high)
+    with stage("morphology"):
+        edged = cv2.dilate(edged, None, iterations=params.dilate_iter)
+        edged = cv2.erode(edged, None, iterations=params.erode_iter)
+    return edged
+
+def filter_contours(cnts, min_area, sort=True):
+    """
+    按面积过滤轮廓并（可选）从左到右排序。所有轮廓点拼接为一个数组，
+    用鞋带公式和 reduceat 一次算出全部面积与最左x坐标，避免逐个轮廓调用
+
+    Returns:
+        (过滤排序后的轮廓列表, 对应面积数组)
+    """
+    if len(cnts) == 0:
+        return [], np.zeros(0)
+    pts = np.concatenate(cnts)[:, 0, :].astype(np.float64)
+    lengths = np.fromiter((len(c) for c in cnts), dtype=np.intp, count=len(cnts))
+    starts = np.cumsum(lengths) - lengths
+    nxt = np.arange(1, len(pts) + 1)
+    nxt[starts + lengths - 1] = starts
+    cross = pts[:, 0] * pts[nxt, 1] - pts[nxt, 0] * pts[:, 1]
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2
+    keep = np.flatnonzero(areas > min_area)
+    if sort:
+        left_x = np.minimum.reduceat(pts[:, 0], starts)
+        keep = keep[np.argsort(left_x[keep], kind="stable")]
+    return [cnts[i] for i in keep], areas[keep]
+
+def trace_contours(edged, params):
+    """边缘图的外轮廓 (RETR_EXTERNAL, CHAIN_APPROX_SIMPLE)"""
+    return imutils.grab_contours(cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+
+def findcontours_order(cnts):
+    """按整图 findContours 的返回顺序排列轮廓：起点（最上最左的像素）光栅顺序的逆序"""
+    if len(cnts) == 0:
+        return []
+    starts = np.array([c[0, 0] for c in cnts])
+    order = np.lexsort((starts[:, 0], starts[:, 1]))[::-1]
+    return [cnts[k] for k in order]
+
+def find_contours(image, params, sort=True, roi=None):
+    """
+    边缘检测后查找外轮廓，按从左到右排序并按面积过滤
+
+    Args:
+        image: BGR图像
+        params: MeasureParams，pyramid_levels>0 时走金字塔粗检+ROI精化路径
+        sort: 是否从左到右排序（需要最左侧参考物体时必须排序）
+        roi: 治具ROI (size_calibration.FixtureROI)，给定时只处理ROI区域，轮廓坐标映射回原图
+    Returns:
+        (过滤后的轮廓列表, 对应面积数组)
+    """
+    mask = None
+    offset = None
+    if roi is not None:
+        (x0, y0, x1, y1), mask = roi.crop(image.shape)
+        image = image[y0:y1, x0:x1]
+        offset = np.array([x0, y0], dtype=np.int32)
+    if image.size == 0:
+        return [], np.zeros(0)
+
+    # 金字塔候选过多时返回None，改用全分辨率（或分块）路径
+    cnts = find_contours_pyramid(image, params, mask) if params.pyramid_levels > 0 else None
+    if cnts is None and params.tile_size > 0:
+        cnts = find_contours_tiled(image, params, mask)
+    elif cnts is None:
+        edged = detect_edges(image, params)
+        if mask is not None:
+            edged = cv2.bitwise_and(edged, mask)
+        with stage("find_contours"):
+            cnts = trace_contours(edged, params)
+    count("contours_found", len(cnts))
+    with stage("filter_sort"):
+        if offset is not None and offset.any():
+            cnts = [c + offset for c in cnts]
+        cnts, areas = filter_contours(cnts, params.min_area, sort)
+    count("contours_kept", len(cnts))
+    return cnts, areas
+
+def find_contours_pyramid(image, params, mask=None):
+    """
+    金字塔粗检 + 全分辨率精化：在缩小 2^pyramid_levels 倍的图像上找候选轮廓，
+    再对每个候选的外接框（外扩 refine_margin）在全分辨率图像上重新做边缘检测。
+    只保留完整落在ROI内部（不受ROI模糊和形态学边界效应影响）的轮廓；
+    粗检时粘连的相邻零件在同一个ROI中会被分别找回。mask 为治具ROI掩膜（与image同尺寸）。
+
+    结果不保证与全图处理一致：Canny 滞后阈值沿弱边缘的连接不是局部的，ROI 内的弱边缘链可能断开或多连出一段，
+    粗检层也会漏掉低对比度、细小的轮廓。干净背景上两者一致；纹理背景上会有少数图片多出或缺少轮廓，
+    且候选很多、精化反而比全图处理慢，因此精化ROI总面积超过整图 pyramid_max_roi 比例时返回None，
+    由调用方改用全分辨率路径。实际精度和速度用 size_benchmark.py 在实拍图片上对比。
+
+    Returns:
+        全分辨率坐标下的轮廓列表（未过滤、未排序）；候选过多时返回None
+    """
+    img_h, img_w = image.shape[:2]
+    factor = 2 ** params.pyramid_levels
+    # 只用于找候选，双线性抽样足够且远快于 INTER_AREA/pyrDown
+    with stage("pyramid_resize"):
+        small = cv2.resize(image, (max(1, img_w // factor), max(1, img_h // factor)),
+                           interpolation=cv2.INTER_LINEAR)
+    scale_x = img_w / small.shape[1]
+    scale_y = img_h / small.shape[0]
+
+    # 粗检：模糊核与面积阈值按缩放比例缩小
+    coarse_ksize = max(3, (params.blur_ksize // factor) | 1)
+    edged = detect_edges(small, params, coarse_ksize)
+    if mask is not None:
+        edged = cv2.bitwise_and(edged, cv2.resize(mask, (small.shape[1], small.shape[0]),
+                                                  interpolation=cv2.INTER_NEAREST))
+    with stage("find_contours"):
+        candidates = imutils.grab_contours(cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+    count("pyramid_candidates", len(candidates))
+    coarse_min_area = params.min_area / (scale_x * scale_y)
+
+    # band: ROI边缘受模糊和形态学边界效应影响的宽度，触及该区域的轮廓交给相邻ROI或丢弃
+    band = params.blur_ksize // 2 + params.dilate_iter + params.erode_iter + 1
+    pad = params.refine_margin + band
+    rois = []
+    roi_area = 0
+    for cand in filter_contours(candidates, coarse_min_area, sort=False)[0]:
+        x, y, w, h = cv2.boundingRect(cand)
+        roi = (max(0, int(x * scale_x) - pad), max(0, int(y * scale_y) - pad),
+               min(img_w, int(np.ceil((x + w) * scale_x)) + pad), min(img_h, int(np.ceil((y + h) * scale_y)) + pad))
+        roi_area += (roi[2] - roi[0]) * (roi[3] - roi[1])
+        if roi_area > params.pyramid_max_roi * img_w * img_h:
+            count("pyramid_fallback")
+            return None
+        rois.append(roi)
+
+    refined = []
+    seen = set()
+    for x0, y0, x1, y1 in rois:
+        # 图像边界处没有边界效应，无需留出band
+        lx = x0 + band if x0 > 0 else 0
+        ly = y0 + band if y0 > 0 else 0
+        hx = x1 - band if x1 < img_w else img_w
+        hy = y1 - band if y1 < img_h else img_h
+
+        roi_edges = detect_edges(image[y0:y1, x0:x1], params)
+        if mask is not None:
+            roi_edges = cv2.bitwise_and(roi_edges, mask[y0:y1, x0:x1])
+        with stage("find_contours"):
+            roi_cnts = imutils.grab_contours(cv2.findContours(roi_edges, cv2.RETR_EXTERNAL,
+                                                              cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0)))
+        for c in roi_cnts:
+            key = cv2.boundingRect(c)
+            bx, by, bw, bh = key
+            if bx < lx or by < ly or bx + bw > hx or by + bh > hy:
                 continue
-            if image is None:
+            # 相邻候选的ROI重叠时同一轮廓会被找到多次
+            if key not in seen:
+                seen.add(key)
+                refined.append(c)
+    return refined
+
+def _canny_candidates(image, params, x0, y0, x1, y1):
+    """
+    图像 [y0:y1, x0:x1] 区域的 Canny 候选边缘和强边缘：候选边缘为梯度超过低阈值的非极大值抑制点，
+    强边缘为其中超过高阈值的点。区域外扩 模糊半径+2（Sobel 与非极大值抑制各1像素）计算，与整图计算逐像素一致
+    """
+    img_h, img_w = image.shape[:2]
+    halo = params.blur_ksize // 2 + 2
+    ex0, ey0 = max(0, x0 - halo), max(0, y0 - halo)
+    ex1, ey1 = min(img_w, x1 + halo), min(img_h, y1 + halo)
+    with stage("gray_blur"):
+        crop = image[ey0:ey1, ex0:ex1]
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        blur = cv2.GaussianBlur(gray, (params.blur_ksize, params.blur_ksize), 0)
+    low, high = sorted((params.canny_low, params.canny_high))
+    core = (slice(y0 - ey0, y1 - ey0), slice(x0 - ex0, x1 - ex0))
+    with stage("canny"):
+        weak = cv2.Canny(blur, low, low)[core]
+        strong = cv2.Canny(blur, high, high)[core]
+    return weak, strong
+
+def _border_pairs(a, b):
+    """相邻两块接缝两侧（a、b 为接缝两侧一行/一列像素的全局连通域编号，背景为-1）8邻接的编号对"""
+    pairs = np.concatenate([np.stack([a, b], axis=1),
+                            np.stack([a[1:], b[:-1]], axis=1),
+                            np.stack([a[:-1], b[1:]], axis=1)])
+    return pairs[(pairs[:, 0] >= 0) & (pairs[:, 1] >= 0)]
+
+def tiled_canny(image, params, tile):
+    """
+    分块计算与整图 cv2.Canny 一致的边缘，返回按行打包（np.packbits）的整图边缘位图，每像素1位。
+
+    Canny 的滞后阈值：候选边缘（超过低阈值的非极大值抑制点）中，8邻接连通域含有强边缘点（超过高阈值）的整段保留。
+    候选边缘和强边缘只依赖局部像素，可以逐块计算；连通关系跨块，先在块内标记连通域，
+    再用并查集合并接缝两侧相邻的连通域，最后每块只保留所属全局连通域含强边缘点的候选边缘。
+
+    Args:
+        tile: 块边长，取为8的倍数，块的左边界与打包字节对齐
+    """
+    img_h, img_w = image.shape[:2]
+    tile = max(8, (tile + 7) // 8 * 8)
+    packed = np.zeros((img_h, (img_w + 7) // 8), np.uint8)
+    offsets = {}    # 块左上角 → 块内连通域编号的全局偏移
+    borders = {}    # 块左上角 → (上行, 下行, 左列, 右列) 的全局编号，背景为-1
+    has_strong = []
+    total = 0
+    for ty in range(0, img_h, tile):
+        for tx in range(0, img_w, tile):
+            x1, y1 = min(img_w, tx + tile), min(img_h, ty + tile)
+            count("tiles")
+            weak, strong = _canny_candidates(image, params, tx, ty, x1, y1)
+            with stage("hysteresis"):
+                n, labels = cv2.connectedComponents(weak, connectivity=8, ltype=cv2.CV_32S)
+                flags = np.zeros(n, dtype=bool)
+                flags[labels[strong > 0]] = True
+                flags[0] = False
+                glabels = np.where(labels > 0, labels + total, -1)
+                offsets[ty, tx] = total
+                borders[ty, tx] = (glabels[0], glabels[-1], glabels[:, 0], glabels[:, -1])
+                has_strong.append(flags)
+                total += n
+                packed[ty:y1, tx // 8:(x1 + 7) // 8] = np.packbits(weak > 0, axis=1)
+    has_strong = np.concatenate(has_strong)
+
+    with stage("hysteresis"):
+        pairs = []
+        for (ty, tx), (top, bottom, left, right) in borders.items():
+            if (ty, tx + tile) in borders:
+                pairs.append(_border_pairs(right, borders[ty, tx + tile][2]))
+            if (ty + tile, tx) in borders:
+                pairs.append(_border_pairs(bottom, borders[ty + tile, tx][0]))
+            # 对角相邻的块只在角点处接触
+            if (ty + tile, tx + tile) in borders:
+                pairs.append(_border_pairs(bottom[-1:], borders[ty + tile, tx + tile][0][:1])[:1])
+            if (ty + tile, tx - tile) in borders:
+                pairs.append(_border_pairs(bottom[:1], borders[ty + tile, tx - tile][0][-1:])[:1])
+        pairs = np.unique(np.concatenate(pairs), axis=0) if pairs else np.zeros((0, 2), np.int64)
+
+        parent = {}
+        def find(a):
+            root = a
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while a != root:
+                parent[a], a = root, parent[a]
+            return root
+        for a, b in pairs.tolist():
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[ra] = rb
+        nodes = list(parent)
+        roots = [find(a) for a in nodes]
+        for a, root in zip(nodes, roots):
+            has_strong[root] |= has_strong[a]
+        for a, root in zip(nodes, roots):
+            has_strong[a] = has_strong[root]
+
+        # 块内重新标记（与第一遍相同），只保留含强边缘点的连通域
+        for (ty, tx), offset in offsets.items():
+            x1, y1 = min(img_w, tx + tile), min(img_h, ty + tile)
+            block = packed[ty:y1, tx // 8:(x1 + 7) // 8]
+            weak = np.unpackbits(block, axis=1, count=x1 - tx)
+            _, labels = cv2.connectedComponents(weak, connectivity=8, ltype=cv2.CV_32S)
+            block[...] = np.packbits((labels > 0) & has_strong[labels + offset], axis=1)
+    return packed
+
+def _edge_contours(packed, params, mask, x0, y0, x1, y1):
+    """打包边缘位图 [y0:y1, x0:x1] 区域膨胀/腐蚀后的外轮廓，轮廓为全图坐标"""
+    bx = x0 // 8
+    edged = np.unpackbits(packed[y0:y1, bx:(x1 + 7) // 8], axis=1)[:, x0 - bx * 8:x1 - bx * 8] * np.uint8(255)
+    with stage("morphology"):
+        edged = cv2.dilate(edged, None, iterations=params.dilate_iter)
+        edged = cv2.erode(edged, None, iterations=params.erode_iter)
+    if mask is not None:
+        edged = cv2.bitwise_and(edged, mask[y0:y1, x0:x1])
+    with stage("find_contours"):
+        cnts = trace_contours(edged, params)
+    if x0 or y0:
+        offset = np.array([x0, y0], dtype=np.int32)
+        cnts = [c + offset for c in cnts]
+    return cnts
+
+def _interior(x0, y0, x1, y1, band, img_w, img_h):
+    """区域去掉边界带后的范围；图像边界处没有边界效应，无需留出band"""
+    return (x0 + band if x0 > 0 else 0, y0 + band if y0 > 0 else 0,
+            x1 - band if x1 < img_w else img_w, y1 - band if y1 < img_h else img_h)
+
+def find_contours_tiled(image, params, mask=None):
+    """
+    分块处理超大图像（如600dpi平板扫描图）：灰度、模糊、Canny 等中间结果只按块大小分配，
+    整图只保留一份每像素1位的打包边缘位图（tiled_canny，与整图 Canny 逐像素一致）。
+
+    轮廓提取同样分块：每块外扩 halo 像素做膨胀/腐蚀和轮廓提取，完整落在块内部（轮廓及其外圈一像素
+    都不受形态学边界效应影响）的轮廓与整图处理一致，直接保留，相邻块重复找到的按外接框去重；
+    触及块边缘的轮廓片段只记录外接框，相交的片段合并成一个区域后重新提取，
+    片段所在的轮廓仍触及区域边缘时扩大区域重做，保证跨块零件完整。
+    最后去掉实际位于其他轮廓孔洞内的轮廓，并按整图 findContours 的顺序返回，
+    面积过滤后的结果与不分块处理一致。跨块区域的大小取决于零件大小而不是整图大小。
+
+    Returns:
+        全分辨率坐标下的轮廓列表（未过滤、未排序）
+    """
+    img_h, img_w = image.shape[:2]
+    packed = tiled_canny(image, params, params.tile_size)
+    tile = params.tile_size
+    # band: 受区域边界影响的宽度（膨胀/腐蚀次数），再加轮廓外圈一像素
+    band = params.dilate_iter + params.erode_iter + 1
+    halo = band + params.refine_margin
+
+    cnts = []
+    seen = set()
+    fragments = []  # 触及块边缘的轮廓片段外接框 (x0, y0, x1, y1)
+    for ty in range(0, img_h, tile):
+        for tx in range(0, img_w, tile):
+            x0, y0 = max(0, tx - halo), max(0, ty - halo)
+            x1, y1 = min(img_w, tx + tile + halo), min(img_h, ty + tile + halo)
+            lx, ly, hx, hy = _interior(x0, y0, x1, y1, band, img_w, img_h)
+            for c in _edge_contours(packed, params, mask, x0, y0, x1, y1):
+                key = cv2.boundingRect(c)
+                bx, by, bw, bh = key
+                if bx < lx or by < ly or bx + bw > hx or by + bh > hy:
+                    fragments.append((bx, by, bx + bw, by + bh))
+                elif key not in seen:
+                    seen.add(key)
+                    cnts.append(c)
+
+    # 片段外接框外扩 halo 后画在缩小 cell 倍的网格上，每个连通域是一个需要重新提取的区域
+    cell = 16
+    grid = np.zeros(((img_h + cell - 1) // cell, (img_w + cell - 1) // cell), np.uint8)
+    for fx0, fy0, fx1, fy1 in fragments:
+        grid[max(0, fy0 - halo) // cell:(min(img_h, fy1 + halo) - 1) // cell + 1,
+             max(0, fx0 - halo) // cell:(min(img_w, fx1 + halo) - 1) // cell + 1] = 1
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(grid, connectivity=8)
+    count("tile_regions", n - 1)
+    region_fragments = [[] for _ in range(n)]
+    for f in fragments:
+        region_fragments[labels[f[1] // cell, f[0] // cell]].append(f)
+
+    for label in range(1, n):
+        gx, gy, gw, gh = (int(v) for v in stats[label, :4])
+        x0, y0 = gx * cell, gy * cell
+        x1, y1 = min(img_w, (gx + gw) * cell), min(img_h, (gy + gh) * cell)
+        frags = np.array(region_fragments[label]).reshape(-1, 4)
+        while True:
+            lx, ly, hx, hy = _interior(x0, y0, x1, y1, band, img_w, img_h)
+            found = _edge_contours(packed, params, mask, x0, y0, x1, y1)
+            rects = [cv2.boundingRect(c) for c in found]
+            # 只有与本区域片段重叠的轮廓触及区域边缘时才需要扩大；其他触及边缘的轮廓属于别的块或区域
+            grow = [(bx, by, bx + bw, by + bh) for bx, by, bw, bh in rects
+                    if (bx < lx or by < ly or bx + bw > hx or by + bh > hy)
+                    and np.any((frags[:, 0] < bx + bw) & (frags[:, 2] > bx) &
+                               (frags[:, 1] < by + bh) & (frags[:, 3] > by))]
+            if not grow:
+                break
+            x0 = max(0, min([x0] + [g[0] - halo for g in grow]))
+            y0 = max(0, min([y0] + [g[1] - halo for g in grow]))
+            x1 = min(img_w, max([x1] + [g[2] + halo for g in grow]))
+            y1 = min(img_h, max([y1] + [g[3] + halo for g in grow]))
+        for c, key in zip(found, rects):
+            bx, by, bw, bh = key
+            if bx >= lx and by >= ly and bx + bw <= hx and by + bh <= hy and key not in seen:
+                seen.add(key)
+                cnts.append(c)
+
+    # 块或区域内看不到完整外圈的轮廓（实际位于其他轮廓的孔洞内）整图 RETR_EXTERNAL 不会返回，统一去掉。
+    # 外接框满足 (w-1)*(h-1) <= min_area 的轮廓及其孔洞内的轮廓都会被面积过滤，不必检查
+    rects = np.array([cv2.boundingRect(c) for c in cnts], dtype=np.int64).reshape(-1, 4)
+    big = np.flatnonzero((rects[:, 2] - 1) * (rects[:, 3] - 1) > params.min_area)
+    bx0, by0 = rects[big, 0], rects[big, 1]
+    bx1, by1 = bx0 + rects[big, 2], by0 + rects[big, 3]
+    enclosed = np.zeros(len(cnts), dtype=bool)
+    for k, outer in enumerate(big):
+        for i in big[(bx0 > bx0[k]) & (by0 > by0[k]) & (bx1 < bx1[k]) & (by1 < by1[k])]:
+            if not enclosed[i]:
+                pt = (float(cnts[i][0, 0, 0]), float(cnts[i][0, 0, 1]))
+                enclosed[i] = cv2.pointPolygonTest(cnts[outer], pt, False) > 0
+    return findcontours_order([c for c, e in zip(cnts, enclosed) if not e])
+
+def rects_to_boxes(rects):
+    """
+    向量化的 cv2.boxPoints：(N,5) 的 [cx, cy, w, h, angle] → (N,4,2) 整数角点。
+    与 boxPoints 一样以 float32 计算后截断为整数，保证与逐个调用结果一致。
+    OpenCV 4.x 的后两个角点由前两个关于中心对称得到（2*center - pt），5.x 改为直接计算，
+    两种算法的舍入不同，截断后可能差1像素，这里按当前 OpenCV 版本选择
+    """
+    rects = rects.astype(np.float32)
+    theta = rects[:, 4].astype(np.float64) * np.pi / 180
+    b = np.cos(theta).astype(np.float32) * np.float32(0.5)
+    a = np.sin(theta).astype(np.float32) * np.float32(0.5)
+    cx, cy, w, h = rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3]
+    p0 = np.stack([cx - a * h - b * w, cy + b * h - a * w], axis=1)
+    p1 = np.stack([cx + a * h - b * w, cy - b * h - a * w], axis=1)
+    if _BOXPOINTS_DIRECT:
+        p2 = np.stack([cx + a * h + b * w, cy - b * h + a * w], axis=1)
+        p3 = np.stack([cx - a * h + b * w, cy + b * h + a * w], axis=1)
+    else:
+        p2 = 2 * np.stack([cx, cy], axis=1) - p0
+        p3 = 2 * np.stack([cx, cy], axis=1) - p1
+    return np.stack([p0, p1, p2, p3], axis=1).astype(np.int32)
+
+def order_boxes(boxes):
+    """向量化的 perspective.order_points：(N,4,2) 角点 → 按 tl, tr, br, bl 排序"""
+    n = len(boxes)
+    rows = np.arange(n)[:, None]
+    x_sorted = boxes[rows, np.argsort(boxes[:, :, 0], axis=1, kind="stable")]
+    left, right = x_sorted[:, :2], x_sorted[:, 2:]
+    left = left[rows, np.argsort(left[:, :, 1], axis=1, kind="stable")]
+    tl, bl = left[:, 0], left[:, 1]
+    # 右侧两点中离tl较远的为br
+    d = np.linalg.norm(right - tl[:, None, :].astype(np.float64), axis=2)
+    far = (d[:, 1] >= d[:, 0]).astype(np.intp)
+    br = right[np.arange(n), far]
+    tr = right[np.arange(n), 1 - far]
+    return np.stack([tl, tr, br, bl], axis=1)
+
+def measure_contours(cnts, areas, image_size, params, pixel_per_cm=None):
+    """
+    向量化测量阶段：所有轮廓的角点堆叠为一个数组，一次性计算宽、高、角度和置信度
+
+    Args:
+        cnts: 轮廓列表（已从左到右排序）
+        areas: 对应轮廓面积
+        image_size: (高, 宽)
+        params: MeasureParams
+        pixel_per_cm: 像素/cm比例，None时以第一个（最左侧）轮廓作为参考物体计算
+    Returns:
+        (MEASUREMENT_DTYPE 结构化数组, pixel_per_cm)
+    """
+    rects = np.array([(cx, cy, w, h, a) for ((cx, cy), (w, h), a) in map(cv2.minAreaRect, cnts)],
+                     dtype=np.float64).reshape(-1, 5)
+    boxes = order_boxes(rects_to_boxes(rects))
+    tl, tr, br = (boxes[:, i].astype(np.float64) for i in range(3))
+    width_px = np.linalg.norm(tr - tl, axis=1)
+    height_px = np.linalg.norm(br - tr, axis=1)
+
+    if pixel_per_cm is None:
+        # 参考物体
+        if width_px[0] == 0:
+            return np.zeros(0, dtype=MEASUREMENT_DTYPE), None
+        pixel_per_cm = width_px[0] / params.ref_width_cm
+
+    records = np.zeros(len(cnts), dtype=MEASUREMENT_DTYPE)
+    records["index"] = np.arange(len(cnts))
+    records["width_mm"] = width_px / pixel_per_cm * params.mm_scale
+    records["height_mm"] = height_px / pixel_per_cm * params.mm_scale
+    # 偏转角度：OpenCV的angle定义，宽<高时为与X轴夹角，宽>高时angle+90；以Y轴为基准取90-rotation_angle
+    rotation_angle = np.where(records["width_mm"] < records["height_mm"], rects[:, 4], rects[:, 4] + 90)
+    records["angle"] = 90 - rotation_angle
+    complexities = np.fromiter(
+        (len(cv2.approxPolyDP(c, 0.02 * cv2.arcLength(c, True), True)) for c in cnts),
+        dtype=np.intp, count=len(cnts))
+    records["confidence"] = calculate_confidences(areas, complexities, image_size)
+    records["box"] = boxes
+    return records, pixel_per_cm
+
+def assign_slots(records, tray, image_size, skip_reference=True):
+    """
+    按测量框中心点把对象分配到托盘槽位（size_calibration.TrayLayout 的栅格索引，一次向量化查找）
+
+    Args:
+        skip_reference: 第一个对象为参考物体时不参与分配
+    Returns:
+        SlotAssignment
+    """
+    slot_ids = tray.assign(records["box"].astype(np.float64).mean(axis=1), image_size)
+    if skip_reference and len(slot_ids):
+        slot_ids[0] = -1
+    parts = slot_ids[1:] if skip_reference else slot_ids
+    counts = np.bincount(parts[parts >= 0], minlength=len(tray.names))
+    return SlotAssignment(
+        slots=[tray.names[i] if i >= 0 else None for i in slot_ids],
+        empty=[tray.names[i] for i in np.flatnonzero(counts == 0)],
+        double=[tray.names[i] for i in np.flatnonzero(counts > 1)],
+        unassigned=int(np.count_nonzero(parts < 0)))
+
+def measure_image(image, params=None, profile=None, roi=None, tray=None):
+    """
+    测量内存中的BGR图像，最左侧轮廓作为参考物体换算像素与实际尺寸。
+    不读写文件、不修改输入图像。
+
+    Args:
+        image: BGR图像 (numpy数组)
+        params: MeasureParams，默认使用 MeasureParams()
+        profile: 标定档案 (size_calibration.CalibrationProfile)，给定时直接使用其像素比例，
+                 跳过参考物体查找和轮廓排序，所有轮廓均作为零件测量
+        roi: 治具ROI (size_calibration.FixtureROI)，只处理ROI区域；未使用标定档案时参考物体也须在ROI内
+        tray: 托盘布局 (size_calibration.TrayLayout)，给定时为每个对象分配槽位并统计空槽位和重复槽位
+    Returns:
+        ImageMeasurement
+    """
+    if params is None:
+        params = MeasureParams()
+    image_size = image.shape[:2]
+    if profile is not None and tuple(profile.image_size) != tuple(image_size):
+        return ImageMeasurement(image_size=image_size, error="图像尺寸与标定档案不一致")
+    if params.precheck:
+        check_image = image
+        if roi is not None:
+            (x0, y0, x1, y1), _ = roi.crop(image.shape)
+            check_image = image[y0:y1, x0:x1]
+        with stage("precheck"):
+            reason = check_frame(check_image, params) if check_image.size else "ROI为空"
+        if reason is not None:
+            return ImageMeasurement(image_size=image_size, error=reason, rejected=True)
+
+    cnts, areas = find_contours(image, params, sort=profile is None, roi=roi)
+    if len(cnts) == 0:
+        return ImageMeasurement(image_size=image_size, error="未找到有效轮廓")
+
+    with stage("measure"):
+        if profile is not None:
+            params = replace(params, mm_scale=profile.mm_scale)
+            records, pixel_per_cm = measure_contours(cnts, areas, image_size, params, profile.pixel_per_cm)
+        else:
+            records, pixel_per_cm = measure_contours(cnts, areas, image_size, params)
+    if pixel_per_cm is None:
+        return ImageMeasurement(image_size=image_size, error="参考物体尺寸为0")
+    result = ImageMeasurement(image_size=image_size, pixel_per_cm=pixel_per_cm, records=records,
+                              reference=profile is None)
+    if tray is not None:
+        result.tray = assign_slots(records, tray, image_size, skip_reference=profile is None)
+    return result
+
+def overlay_labels(result):
+    """
+    标注文字及位置，绘制图片和矢量标注文件共用
+
+    Returns:
+        [(对象序号, 文字, (x, y), BGR颜色, 字号)]，对象序号为-1表示整图标注
+    """
+    labels = []
+    for r in result.records:
+        (tl, tr, br, bl) = r["box"]
+        mid_pt_horizontal = (tl[0] + int(abs(tr[0] - tl[0])/2), tl[1] + int(abs(tr[1] - tl[1])/2))
+        mid_pt_verticle = (tr[0] + int(abs(tr[0] - br[0])/2), tr[1] + int(abs(tr[1] - br[1])/2))
+        idx = int(r["index"])
+        labels.append((idx, "{:.1f}mm".format(r["width_mm"]),
+                       (int(mid_pt_horizontal[0] - 15), int(mid_pt_horizontal[1] - 10)), (255, 255, 0), 0.5))
+        labels.append((idx, "{:.1f}mm".format(r["height_mm"]),
+                       (int(mid_pt_verticle[0] + 10), int(mid_pt_verticle[1])), (255, 255, 0), 0.5))
+        # 标注偏转角度
+        labels.append((idx, "Angle:{:.1f}".format(r["angle"]), (int(tl[0]), int(tl[1]) - 25), (0, 255, 255), 0.5))
+    # 只在左上角输出主对象置信度
+    if len(result.records):
+        labels.append((-1, "Conf: {:.1%}".format(result.records[0]["confidence"]), (10, 30), (0, 255, 0), 0.8))
+    return labels
+
+def draw_measurements(image, result):
+    """在图像上绘制测量框、尺寸、偏转角度和主对象置信度（原地修改并返回图像）"""
+    if len(result.records):
+        cv2.drawContours(image, list(result.records["box"]), -1, (0, 0, 255), 2)
+    for _, text, org, color, font_scale in overlay_labels(result):
+        cv2.putText(image, text, org, cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, 2)
+    return image
+
+def _relative_to(path, start):
+    try:
+        return os.path.relpath(path, start)
+    except ValueError:
+        # Windows下不同盘符无法求相对路径
+        return os.path.abspath(path)
+
+def _svg_color(bgr):
+    return "rgb({},{},{})".format(bgr[2], bgr[1], bgr[0])
+
+def save_overlay(result, image_path, overlay_path):
+    """
+    把测量框、标注文字和置信度写成矢量标注文件，代替烧录标注后重新编码整张图片。
+    .json 供程序读取（load_overlay / render_overlay）；.svg 引用原图，浏览器打开即可叠加查看。
+    原图路径以相对于标注文件的路径保存。
+
+    Returns:
+        是否保存成功
+    """
+    try:
+        overlay_dir = os.path.dirname(overlay_path)
+        if overlay_dir:
+            os.makedirs(overlay_dir, exist_ok=True)
+        image_ref = _relative_to(image_path, overlay_dir or ".")
+        h, w = result.image_size
+        labels = overlay_labels(result)
+        if overlay_path.lower().endswith(".svg"):
+            href = escape(image_ref.replace(os.sep, "/"), {'"': "&quot;"})
+            lines = [f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                     f'width="{w}" height="{h}" viewBox="0 0 {w} {h}">',
+                     f'<image href="{href}" xlink:href="{href}" x="0" y="0" width="{w}" height="{h}"/>']
+            for r in result.records:
+                points = " ".join(f"{x},{y}" for x, y in r["box"])
+                lines.append(f'<polygon points="{points}" fill="none" stroke="{_svg_color((0, 0, 255))}" '
+                             f'stroke-width="2"/>')
+            for _, text, (x, y), color, font_scale in labels:
+                lines.append(f'<text x="{x}" y="{y}" fill="{_svg_color(color)}" font-family="sans-serif" '
+                             f'font-size="{22 * font_scale:.0f}" font-weight="bold">{escape(text)}</text>')
+            lines.append("</svg>")
+            content = "\n".join(lines) + "\n"
+        else:
+            overlay = {
+                "image": image_ref,
+                "image_size": [int(h), int(w)],
+                "pixel_per_cm": result.pixel_per_cm,
+                "error": result.error,
+                "reference": result.reference,
+                "objects": [{
+                    "index": int(r["index"]),
+                    "width_mm": round(float(r["width_mm"]), 3),
+                    "height_mm": round(float(r["height_mm"]), 3),
+                    "angle": round(float(r["angle"]), 3),
+                    "confidence": round(float(r["confidence"]), 3),
+                    "box": r["box"].tolist(),
+                } for r in result.records],
+            }
+            content = json.dumps(overlay, ensure_ascii=False)
+        with stage("encode_write"):
+            data = content.encode("utf-8")
+            with open(overlay_path, "wb") as f:
+                f.write(data)
+        count("bytes_written", len(data))
+        return True
+    except Exception as e:
+        print(f"保存标注文件时出错: {overlay_path}")
+        print(f"错误信息: {str(e)}")
+        return False
+
+def load_overlay(overlay_path):
+    """
+    读取 .json 矢量标注文件
+
+    Returns:
+        (原图路径, ImageMeasurement)
+    """
+    with open(overlay_path, "r", encoding="utf-8") as f:
+        overlay = json.load(f)
+    records = np.zeros(len(overlay["objects"]), dtype=MEASUREMENT_DTYPE)
+    for i, obj in enumerate(overlay["objects"]):
+        records[i] = (obj["index"], obj["width_mm"], obj["height_mm"], obj["angle"], obj["confidence"], obj["box"])
+    image_path = overlay["image"]
+    if not os.path.isabs(image_path):
+        image_path = os.path.join(os.path.dirname(overlay_path), image_path)
+    result = ImageMeasurement(image_size=tuple(overlay["image_size"]), pixel_per_cm=overlay["pixel_per_cm"],
+                              records=records, error=overlay["error"], reference=overlay.get("reference", False))
+    return image_path, result
+
+def render_overlay(overlay_path):
+    """按需把 .json 标注叠加到未修改的原图上，返回标注后的图像（原图无法读取时返回None）"""
+    image_path, result = load_overlay(overlay_path)
+    image = read_image(image_path)
+    if image is None:
+        return None
+    return draw_measurements(image, result)
+
+def list_images(image_directory):
+    return [fn for fn in os.listdir(image_directory) if fn.endswith(IMAGE_EXTENSIONS)]
+
+@lru_cache(maxsize=2)
+def load_lens_cached(lens_file):
+    """每个进程只加载一次镜头映射表（映射表较大，不随任务在进程间传递）"""
+    from size_calibration import load_lens_maps
+    return load_lens_maps(lens_file)
+
+def annotate_flags(index, annotate="all", sample_every=10):
+    """根据标注模式决定第index张图片 (成功时是否保存标注图, 失败时是否保存原图)"""
+    if annotate == "none":
+        return False, False
+    if annotate == "failures":
+        return False, True
+    if annotate == "sample":
+        return index % max(1, sample_every) == 0, False
+    return True, False
+
+def process_image_file(image_path, processed_dir, params=None, profile=None, lens_file=None,
+                       flags=(True, False), overlay="jpg", roi=None, timing=False, tray=None, image_writer=None):
+    """
+    读取、测量、标注并保存单张图片（批处理工作进程调用，不写结果文件）
+    lens_file 给定时先用镜头映射表对图像做一次 remap，再进行轮廓检测
+
+    Args:
+        flags: (成功时是否保存标注图, 失败时是否保存原图)，见 annotate_flags；
+               都为False时只测量，不做绘制和JPEG编码
+        overlay: 标注输出格式，"json"/"svg" 时写矢量标注文件代替JPEG。标注文件叠加在未校正的原图上，
+                 使用镜头映射表时测量框角点换算回原图坐标
+        roi: 治具ROI，只测量ROI区域
+        timing: 记录分阶段耗时和计数，结果的 stats 字段返回（读取失败时不返回统计）
+        tray: 托盘布局，给定时结果的 tray 字段为槽位分配
+        image_writer: 标注图片写入器，决定图片格式和扩展名。size_writer.ImageWriter 交给后台线程编码写入
+                      （只能在主进程中使用），SyncImageWriter 同步写入；None 时同步写入JPEG
+    Returns:
+        (文件名, 保存的图片路径或None, ImageMeasurement)；读取失败时 ImageMeasurement 为None
+    """
+    if not timing:
+        return _process_image_file(image_path, processed_dir, params, profile, lens_file, flags, overlay, roi, tray,
+                                   image_writer)
+    start_image()
+    try:
+        filename, processed_path, result = _process_image_file(image_path, processed_dir, params, profile,
+                                                               lens_file, flags, overlay, roi, tray, image_writer)
+    finally:
+        stats = finish_image()
+    if result is not None:
+        result.stats = stats
+    return filename, processed_path, result
+
+def _process_image_file(image_path, processed_dir, params, profile, lens_file, flags, overlay, roi, tray,
+                        image_writer=None):
+    save_success, save_failure = flags
+    filename = os.path.basename(image_path)
+    with stage("decode"):
+        image = read_image(image_path)
+    if image is None:
+        return filename, None, None
+    if lens_file:
+        lens = load_lens_cached(lens_file)
+        if image.shape[:2] != tuple(lens.image_size):
+            return filename, None, ImageMeasurement(image_size=image.shape[:2], error="图像尺寸与镜头标定不一致")
+        with stage("lens_remap"):
+            image = cv2.remap(image, lens.map1, lens.map2, cv2.INTER_LINEAR)
+
+    result = measure_image(image, params, profile, roi, tray)
+    base_name = os.path.splitext(filename)[0]
+    if not (save_failure if not result.ok else save_success):
+        return filename, None, result
+    suffix = "processed" if result.ok else "failed"
+    if overlay != "jpg":
+        overlay_path = os.path.join(processed_dir, f"{base_name}_{suffix}.{overlay}")
+        overlay_result = result
+        if lens_file and len(result.records):
+            # 矢量标注叠加在未校正的原图上：测量框角点按映射表换算回原图坐标
+            from size_calibration import corrected_to_raw
+            records = result.records.copy()
+            records["box"] = np.rint(corrected_to_raw(records["box"], lens)).astype(np.int32)
+            overlay_result = replace(result, records=records)
+        save_overlay(overlay_result, image_path, overlay_path)
+        return filename, overlay_path, result
+
+    # 保存处理后图片
+    extension = image_writer.extension if image_writer is not None else ".jpg"
+    processed_path = os.path.join(processed_dir, f"{base_name}_{suffix}{extension}")
+    if result.ok:
+        with stage("draw"):
+            image = draw_measurements(image, result)
+    if image_writer is not None:
+        image_writer.submit(image, processed_path)
+    else:
+        save_image(image, processed_path)
+    return filename, processed_path, result
+
+def measurement_fingerprint(params=None, profile=None, lens_file=None, roi=None, tray=None):
+    """测量参数、标定档案、镜头映射表、治具ROI和托盘布局的指纹，任何一项变化都会使已有结果失效"""
+    state = {
+        "tray": [[name, list(map(int, rect))] for name, rect in zip(tray.names, tray.rects)] if tray else None,
+        "roi": [[list(map(int, pt)) for pt in poly] for poly in roi.polygons] if roi is not None else None,
+        "params": asdict(params if params is not None else MeasureParams()),
+        "profile": asdict(profile) if profile is not None else None,
+        "lens": file_hash(lens_file) if lens_file else None,
+    }
+    # 档案的创建时间和来源不影响测量结果
+    if state["profile"]:
+        state["profile"].pop("created", None)
+        state["profile"].pop("source_image", None)
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def write_tray_report(f, filename, tray):
+    """写入一张图片的槽位报告（JSON Lines），有空槽位或重复槽位时打印并返回True"""
+    f.write(json.dumps({"image": filename, "empty": tray.empty, "double": tray.double,
+                        "unassigned": tray.unassigned}, ensure_ascii=False) + "\n")
+    if tray.empty or tray.double:
+        print(f"托盘 {filename}: 空槽位 {len(tray.empty)} 个 {' '.join(tray.empty[:10])}"
+              f"{' ...' if len(tray.empty) > 10 else ''}，重复槽位 {' '.join(tray.double) or '无'}")
+        return True
+    return False
+
+def process_directory(image_directory, processed_dir, results_directory, params=None, workers=1, profile=None,
+                      lens_file=None, annotate="all", sample_every=10, overlay="jpg", result_format="txt",
+                      resume=False, roi=None, timing=False, tray=None, image_format="jpg", quality=None,
+                      write_queue=8):
+    """
+    遍历图片目录，测量并保存标注图片，结果写入 detection_results_{时间戳}.{result_format}
+
+    Args:
+        workers: 工作进程数，>1 时图片分发到进程池并行处理；
+                 结果仍由主进程按输入顺序写入，保证结果文件可复现
+        profile: 标定档案，给定时各图片不再查找参考物体
+        lens_file: 镜头映射表文件 (size_calibration.save_lens_maps)，给定时测量前校正畸变和透视
+        annotate: 标注图片保存方式，见 ANNOTATE_MODES；"none" 时只输出测量结果
+        sample_every: annotate="sample" 时每隔多少张保存一张标注图
+        overlay: 标注输出格式，见 OVERLAY_FORMATS
+        result_format: 结果文件格式，见 size_results.RESULT_FORMATS；
+                       csv/jsonl/parquet 每个对象一行，失败图片也有一行记录失败原因
+        resume: 断点续跑。结果追加到固定文件 detection_results.{格式}（parquet 每次运行写一个分片），
+                results_directory/manifest_{格式}.jsonl 记录已处理图片，只处理新增或内容/参数变化的图片；
+                无法读取的图片不写结果行，下次运行重试，累计 RunManifest.max_read_retries 次后写一行失败记录
+        roi: 治具ROI (size_calibration.FixtureROI)，只测量ROI区域
+        timing: 分阶段计时和计数，运行结束时输出汇总，
+                每张图片的记录写入 results_directory/stage_stats_{时间戳}.jsonl；
+                后台线程写入标注图片时 encode_write 耗时和 bytes_written 只计入汇总
+        tray: 托盘布局 (size_calibration.TrayLayout)，结果的 slot 列为槽位名称，
+              每张图片的空槽位和重复槽位写入 results_directory/tray_report_{时间戳}.jsonl
+        image_format, quality: 标注图片格式（见 size_writer.IMAGE_FORMATS）和编码质量
+        write_queue: 单进程时标注图片交给后台线程编码写入，最多排队的图片数；0 时同步写入。
+                     多进程时各工作进程同步写入
+    Returns:
+        结果文件路径；断点续跑且没有需要处理的图片时返回None
+    """
+    os.makedirs(results_directory, exist_ok=True)
+    # 生成结果文件名（使用时间戳）
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    image_paths = [os.path.join(image_directory, fn) for fn in sorted(list_images(image_directory))]
+    manifest = None
+    if resume:
+        manifest = RunManifest(os.path.join(results_directory, f"manifest_{result_format}.jsonl"))
+        fingerprint = measurement_fingerprint(params, profile, lens_file, roi, tray)
+        total = len(image_paths)
+        image_paths = [p for p in image_paths if not manifest.is_done(p, fingerprint)]
+        print(f"断点续跑: 共 {total} 张图片，跳过已处理 {total - len(image_paths)} 张")
+        if not image_paths:
+            print("没有需要处理的新图片")
+            return None
+        # parquet 无法追加，每次运行写一个分片（同一秒内多次运行时加序号）
+        base_name = f"detection_results_{timestamp}" if result_format == "parquet" else "detection_results"
+        shard = 1
+        while result_format == "parquet" and os.path.exists(os.path.join(results_directory, f"{base_name}.parquet")):
+            base_name = f"detection_results_{timestamp}_{shard}"
+            shard += 1
+    else:
+        base_name = f"detection_results_{timestamp}"
+    writer = open_result_writer(os.path.join(results_directory, base_name), result_format)
+    result_file = writer.path
+    flags = [annotate_flags(i, annotate, sample_every) for i in range(len(image_paths))]
+    run_stats = RunStats(os.path.join(results_directory, f"stage_stats_{timestamp}.jsonl")) if timing else None
+    tray_report = open(os.path.join(results_directory, f"tray_report_{timestamp}.jsonl"), 'a',
+                       encoding='utf-8') if tray is not None else None
+    tray_issues = 0  # 有空槽位或重复槽位的图片数
+    image_writer = None
+    if overlay == "jpg" and annotate != "none":
+        if workers > 1 or write_queue <= 0:
+            image_writer = SyncImageWriter(image_format, quality)
+        else:
+            image_writer = ImageWriter(write_queue, image_format, quality)
+
+    rejected = {}   # 预检查拒绝原因 → 数量
+    failed = 0      # 读取或检测失败数量
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if executor is not None:
+            chunksize = max(1, len(image_paths) // (workers * 8))
+            outputs = executor.map(process_image_file, image_paths,
+                                   repeat(processed_dir), repeat(params), repeat(profile),
+                                   repeat(lens_file), flags, repeat(overlay), repeat(roi), repeat(timing),
+                                   repeat(tray), repeat(image_writer), chunksize=chunksize)
+        else:
+            outputs = map(process_image_file, image_paths, repeat(processed_dir), repeat(params), repeat(profile),
+                          repeat(lens_file), flags, repeat(overlay), repeat(roi), repeat(timing), repeat(tray),
+                          repeat(image_writer))
+
+        # executor.map 按提交顺序返回结果，由主进程统一写入
+        for image_path, (filename, processed_path, result) in zip(image_paths, outputs):
+            if result is None and manifest is not None:
+                # 断点续跑时读取失败的图片不写结果行，下次运行重试；多次运行仍无法读取才记为失败
+                attempts = manifest.add_read_failure(image_path, fingerprint)
+                if attempts < manifest.max_read_retries:
+                    print(f"无法读取图像（第 {attempts} 次，下次运行重试）: {image_path}")
+                    failed += 1
+                    continue
+            if result is None:
                 print(f"无法读取图像: {image_path}")
+                result = ImageMeasurement(image_size=(0, 0), error="无法读取图像")
+            elif result.rejected:
+                print(f"预检查拒绝({result.error}): {image_path}")
+            elif not result.ok:
+                print(f"{result.error}: {image_path}")
+            if result.rejected:
+                rejected[result.error] = rejected.get(result.error, 0) + 1
+            elif not result.ok:
+                failed += 1
+            if run_stats is not None:
+                run_stats.add(filename, result.stats)
+                t0 = time.perf_counter()
+                writer.write(filename, processed_path, result)
+                run_stats.add_time("write_results", time.perf_counter() - t0)
+            else:
+                writer.write(filename, processed_path, result)
+            if tray_report is not None and result.tray is not None:
+                tray_issues += write_tray_report(tray_report, filename, result.tray)
+            if manifest is not None:
+                # 读取失败的图片已由 add_read_failure 记入清单
+                if result.error != "无法读取图像":
+                    manifest.add(image_path, fingerprint, result.ok)
+                if len(manifest.pending) >= 50:
+                    writer.flush()
+                    manifest.flush()
+            if not result.ok:
                 continue
+            if processed_path:
+                print(f"图像: {filename} 已处理并保存到 {processed_path}")
+            else:
+                print(f"图像: {filename} 已处理")
+    finally:
+        if image_writer is not None:
+            # 等待后台写完所有标注图片
+            image_writer.close()
+        writer.close()
+        if manifest is not None:
+            manifest.flush()
+        if executor is not None:
+            executor.shutdown()
+        if run_stats is not None:
+            run_stats.close()
+        if tray_report is not None:
+            tray_report.close()
 
-            # 下面为原有处理流程
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            blur = cv2.GaussianBlur(gray, (9, 9), 0)  # 高斯模糊核大小参数 (9, 9)
-            edged = cv2.Canny(blur, 50, 100)          # Canny边缘检测阈值参数 50, 100
-            edged = cv2.dilate(edged, None, iterations=1)  # 膨胀迭代次数参数 1
-            edged = cv2.erode(edged, None, iterations=1)   # 腐蚀迭代次数参数 1
-            cnts = cv2.findContours(edged.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = imutils.grab_contours(cnts)
-            (cnts, _) = contours.sort_contours(cnts)
-            cnts = [x for x in cnts if cv2.contourArea(x) > 100]  # 轮廓面积阈值参数 100
-            if len(cnts) == 0:
-                print(f"未找到有效轮廓: {image_path}")
-                continue
+    elapsed = time.perf_counter() - start
+    rate = len(image_paths) / elapsed if elapsed > 0 else 0.0
+    print(f"结果已保存到: {result_file}")
+    print(f"共处理 {len(image_paths)} 张图片，耗时 {elapsed:.2f} 秒，{rate:.2f} 张/秒 (进程数: {workers})")
+    n_rejected = sum(rejected.values())
+    print(f"成功: {len(image_paths) - n_rejected - failed}，检测失败: {failed}，预检查拒绝: {n_rejected}")
+    for reason, n in sorted(rejected.items()):
+        print(f"  {reason}: {n}")
+    if tray_report is not None:
+        print(f"托盘: {tray_issues} 张图片有空槽位或重复槽位，详见 {tray_report.name}")
+    if isinstance(image_writer, ImageWriter):
+        image_writer.print_summary()
+    if run_stats is not None:
+        if isinstance(image_writer, ImageWriter):
+            image_writer.add_to_stats(run_stats)
+        run_stats.print_summary()
+    return result_file
+
+def watch_directory(image_directory, processed_dir, results_directory, params=None, profile=None, lens_file=None,
+                    annotate="all", sample_every=10, overlay="jpg", result_format="csv",
+                    poll_interval=0.1, settle_time=0.2, max_read_retries=5, roi=None, timing=False, tray=None,
+                    image_format="jpg", quality=None, write_queue=8):
+    """
+    监视采集目录（如 opencv_picture_finally5.py 的 OCR_Captures），新图片写完后立即测量并追加结果。
+    在当前进程内常驻测量，不重复启动解释器和导入依赖；Ctrl+C 停止。
+
+    图片大小和修改时间连续 settle_time 秒不变才视为写完；仍无法解码时稍后重试，
+    超过 max_read_retries 次记为读取失败。结果追加到 detection_results.{格式}，
+    与断点续跑共用 manifest，重启后不会重复测量。内存中（含 manifest 的索引）只保留目录中现存文件的状态。
+    扫描后被移走或删除的文件直接忽略，不会中断监视。
+    timing 为True时每张图片的分阶段统计追加到 stage_stats.jsonl，停止时输出汇总；
+    给定托盘布局时槽位报告追加到 tray_report.jsonl。
+    标注图片默认由后台线程编码写入（write_queue 为排队上限，0 时同步写入），不阻塞下一张图片的测量。
+    """
+    os.makedirs(results_directory, exist_ok=True)
+    manifest = RunManifest(os.path.join(results_directory, f"manifest_{result_format}.jsonl"))
+    fingerprint = measurement_fingerprint(params, profile, lens_file, roi, tray)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_name = f"detection_results_{timestamp}" if result_format == "parquet" else "detection_results"
+    writer = open_result_writer(os.path.join(results_directory, base_name), result_format)
+    run_stats = RunStats(os.path.join(results_directory, "stage_stats.jsonl")) if timing else None
+    tray_report = open(os.path.join(results_directory, "tray_report.jsonl"), 'a',
+                       encoding='utf-8') if tray is not None else None
+    image_writer = None
+    if overlay == "jpg" and annotate != "none":
+        image_writer = (ImageWriter(write_queue, image_format, quality) if write_queue > 0
+                        else SyncImageWriter(image_format, quality))
+
+    waiting = {}      # 文件名 → [(大小, 修改时间), 最近一次变化的时刻, 读取失败次数]
+    finished = set()  # 已处理（或清单中已有）的文件名
+    processed = 0
+    last_present, last_processed = None, None  # 上次清理清单内存索引时的目录内容
+    print(f"开始监视: {image_directory}，结果写入 {writer.path}（Ctrl+C 停止）")
+    try:
+        while True:
+            now = time.monotonic()
+            present = set()
+            with os.scandir(image_directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                        continue
+                    present.add(entry.name)
+                    if entry.name in finished:
+                        continue
+                    try:
+                        st = entry.stat()
+                        signature = (st.st_size, st.st_mtime_ns)
+                        state = waiting.get(entry.name)
+                        if state is None or state[0] != signature:
+                            waiting[entry.name] = [signature, now, state[2] if state else 0]
+                            continue
+                        if now - state[1] < settle_time:
+                            continue
+
+                        image_path = entry.path
+                        if manifest.is_done(image_path, fingerprint):
+                            finished.add(entry.name)
+                            del waiting[entry.name]
+                            continue
+                        filename, processed_path, result = process_image_file(
+                            image_path, processed_dir, params, profile, lens_file,
+                            annotate_flags(processed, annotate, sample_every), overlay, roi, timing, tray, image_writer)
+                        if result is None:
+                            state[2] += 1
+                            state[1] = now
+                            if state[2] < max_read_retries:
+                                continue
+                            print(f"无法读取图像: {image_path}")
+                            result = ImageMeasurement(image_size=(0, 0), error="无法读取图像")
+                        elif result.rejected:
+                            print(f"预检查拒绝({result.error}): {image_path}")
+                        elif not result.ok:
+                            print(f"{result.error}: {image_path}")
+                        else:
+                            latency = time.time() - st.st_mtime
+                            print(f"图像: {filename} 已处理，延迟 {latency:.2f} 秒")
+                        if run_stats is not None:
+                            run_stats.add(filename, result.stats)
+                            run_stats.flush()
+                        writer.write(filename, processed_path, result)
+                        writer.flush()
+                        if tray_report is not None and result.tray is not None:
+                            write_tray_report(tray_report, filename, result.tray)
+                            tray_report.flush()
+                        manifest.add(image_path, fingerprint, result.ok)
+                        manifest.flush()
+                        finished.add(entry.name)
+                        del waiting[entry.name]
+                        processed += 1
+                    except OSError as e:
+                        # 扫描之后文件被移走或删除：丢弃状态，重新出现时重新等待写完；
+                        # 其他访问错误（如权限）按读取失败重试，超过次数后跳过该文件
+                        state = waiting.get(entry.name)
+                        if isinstance(e, FileNotFoundError) or state is None:
+                            waiting.pop(entry.name, None)
+                            continue
+                        state[2] += 1
+                        state[1] = now
+                        if state[2] >= max_read_retries:
+                            print(f"无法访问文件，已跳过: {entry.path}")
+                            print(f"错误信息: {str(e)}")
+                            finished.add(entry.name)
+                            del waiting[entry.name]
+
+            # 只保留目录中仍存在的文件状态（含清单的内存索引），长时间运行内存不随历史文件增长
+            finished &= present
+            for name in list(waiting):
+                if name not in present:
+                    del waiting[name]
+            if present != last_present or processed != last_processed:
+                manifest.prune(present)
+                last_present, last_processed = present, processed
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print(f"停止监视，本次共处理 {processed} 张图片")
+    finally:
+        if image_writer is not None:
+            image_writer.close()
+        writer.close()
+        manifest.flush()
+        if tray_report is not None:
+            tray_report.close()
+        if run_stats is not None:
+            run_stats.close()
+            if isinstance(image_writer, ImageWriter):
+                image_writer.add_to_stats(run_stats)
+            run_stats.print_summary()
+    return writer.path
+
+def main():
+    parser = argparse.ArgumentParser(description='基于参考物体的尺寸测量')
+    parser.add_argument('--input', '-i', default=IMAGE_DIRECTORY, help='输入图片文件夹路径')
+    parser.add_argument('--processed', '-p', default=PROCESSED_DIRECTORY, help='标注图片输出文件夹路径')
+    parser.add_argument('--results', '-r', default=RESULTS_DIRECTORY, help='结果文件输出文件夹路径')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='并行工作进程数，默认1（单进程）；0表示使用全部CPU核心')
+    parser.add_argument('--profile', help='标定档案名称，使用已保存的像素比例，跳过参考物体检测')
+    parser.add_argument('--profile-dir', help='标定档案文件夹路径，默认见 size_calibration.py')
+    parser.add_argument('--lens', help='镜头映射表名称，测量前校正镜头畸变和透视')
+    parser.add_argument('--roi', help='治具ROI名称，只处理ROI区域（见 size_calibration.py --roi-rect/--roi-poly）')
+    parser.add_argument('--tray', help='托盘布局名称，按槽位输出结果并报告空槽位/重复槽位（见 size_calibration.py --tray-grid）')
+    parser.add_argument('--pyramid', type=int, default=0,
+                        help='金字塔粗检层数，默认0（全分辨率检测）；1或2可加速干净背景的大图，'
+                             '纹理背景可能多出或缺少轮廓（用 size_benchmark.py 对比）')
+    parser.add_argument('--annotate', choices=ANNOTATE_MODES, default='all',
+                        help='标注图片保存方式：all全部，none只测量，failures只保存失败图片，sample抽样保存')
+    parser.add_argument('--sample-every', type=int, default=10, help='抽样保存间隔，默认10')
+    parser.add_argument('--overlay', choices=OVERLAY_FORMATS, default='jpg',
+                        help='标注输出格式：jpg烧录标注图片（图片格式见 --image-format），json/svg只写矢量标注文件')
+    parser.add_argument('--image-format', choices=IMAGE_FORMATS, default='jpg', help='标注图片格式，默认jpg')
+    parser.add_argument('--quality', type=int,
+                        help='标注图片编码质量：jpg/webp 为1~100，png 为压缩级别0~9；默认使用OpenCV默认值')
+    parser.add_argument('--write-queue', type=int, default=8,
+                        help='单进程/监视模式下后台写入标注图片的排队上限，默认8；0表示同步写入')
+    parser.add_argument('--format', '-f', choices=RESULT_FORMATS, default='txt',
+                        help='结果文件格式：txt原有文本（只含主对象），csv/jsonl/parquet每个对象一行')
+    parser.add_argument('--resume', action='store_true',
+                        help='断点续跑：只处理新增或变化的图片，结果追加到已有结果文件')
+    parser.add_argument('--watch', action='store_true',
+                        help='持续监视输入文件夹，新图片写完后立即测量并追加结果')
+    parser.add_argument('--poll', type=float, default=0.1, help='监视模式的目录扫描间隔(秒)，默认0.1')
+    parser.add_argument('--precheck', action='store_true',
+                        help='测量前快速检查画面，模糊/空白/过曝/过暗的图片直接拒绝并单独统计')
+    parser.add_argument('--min-sharpness', type=float, default=MeasureParams.min_sharpness,
+                        help='预检查清晰度（拉普拉斯方差）下限，默认30')
+    parser.add_argument('--timing', action='store_true',
+                        help='分阶段计时和计数（解码、模糊、Canny、形态学、轮廓、测量、绘制、编码），'
+                             '输出汇总并把每张图片的记录写入结果文件夹')
+    parser.add_argument('--tile', type=int, default=0,
+                        help='分块处理的块边长(像素)，默认0不分块；超大扫描图可设为2048等以限制内存')
+    args = parser.parse_args()
+    params = MeasureParams(pyramid_levels=args.pyramid, precheck=args.precheck, min_sharpness=args.min_sharpness,
+                           tile_size=args.tile)
+
+    from size_calibration import CALIBRATION_DIRECTORY, lens_path, load_profile, load_roi, load_tray
+    profile_dir = args.profile_dir or CALIBRATION_DIRECTORY
+    lens_file = None
+    if args.lens:
+        lens_file = lens_path(args.lens, profile_dir)
+        if not os.path.exists(lens_file):
+            print(f"镜头标定文件不存在: {lens_file}")
+            sys.exit(1)
+
+    roi = None
+    if args.roi:
+        try:
+            roi = load_roi(args.roi, profile_dir)
+        except FileNotFoundError as e:
+            print(e)
+            sys.exit(1)
+
+    tray = None
+    if args.tray:
+        try:
+            tray = load_tray(args.tray, profile_dir)
+        except FileNotFoundError as e:
+            print(e)
+            sys.exit(1)
+
+    profile = None
+    if args.profile:
+        try:
+            profile = load_profile(args.profile, profile_dir)
+        except FileNotFoundError as e:
+            print(e)
+            sys.exit(1)
+        print(f"使用标定档案: {profile.name} ({profile.pixel_per_cm:.3f} 像素/cm)")
+
+    if args.watch:
+        watch_directory(args.input, args.processed, args.results, params=params, profile=profile,
+                        lens_file=lens_file, annotate=args.annotate, sample_every=args.sample_every,
+                        overlay=args.overlay, result_format=args.format, poll_interval=args.poll, roi=roi,
+                        timing=args.timing, tray=tray, image_format=args.image_format, quality=args.quality,
+                        write_queue=args.write_queue)
+        return
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    process_directory(args.input, args.processed, args.results, params=params, workers=workers,
+                      profile=profile, lens_file=lens_file, annotate=args.annotate, sample_every=args.sample_every,
+                      overlay=args.overlay, result_format=args.format,
+                      resume=args.resume, roi=roi, timing=args.timing, tray=tray,
+                      image_format=args.image_format, quality=args.quality, write_queue=args.write_queue)
 
-            # 参考物体
-            ref_object = cnts[0]
-            box = cv2.minAreaRect(ref_object)
-            box = cv2.boxPoints(box)
-            box = np.array(box, dtype="int")
-            box = perspective.order_points(box)
-            (tl, tr, br, bl) = box
-            dist_in_pixel = euclidean(tl, tr)
-            dist_in_cm = 2
-            pixel_per_cm = dist_in_pixel/dist_in_cm
-
-            # 置信度计算函数
-            def calculate_confidence(contour, image_size):
-                contour_area = cv2.contourArea(contour)
-                image_area = image_size[0] * image_size[1]
-                area_ratio = contour_area / image_area
-                perimeter = cv2.arcLength(contour, True)
-                approx = cv2.approxPolyDP(contour, 0.02 * perimeter, True)
-                complexity = len(approx)
-                confidence = 0.0
-                if 4 <= complexity <= 8:
-                    confidence = 0.6
-                    if 0.1 <= area_ratio <= 0.9:
-                        confidence += 0.2
-                    if len(approx) == 4:
-                        confidence += 0.2
-                return min(confidence, 1.0)
-
-            # 绘制并标注
-            for idx, cnt in enumerate(cnts):
-                rect = cv2.minAreaRect(cnt)
-                box = cv2.boxPoints(rect)
-                box = np.array(box, dtype="int")
-                box = perspective.order_points(box)
-                (tl, tr, br, bl) = box
-                cv2.drawContours(image, [box.astype("int")], -1, (0, 0, 255), 2)
-                mid_pt_horizontal = (tl[0] + int(abs(tr[0] - tl[0])/2), tl[1] + int(abs(tr[1] - tl[1])/2))
-                mid_pt_verticle = (tr[0] + int(abs(tr[0] - br[0])/2), tr[1] + int(abs(tr[1] - br[1])/2))
-                wid = euclidean(tl, tr)/pixel_per_cm
-                ht = euclidean(tr, br)/pixel_per_cm
-
-                # 放大20.6倍，单位改为mm
-                wid_mm = wid * 20.6
-                ht_mm = ht * 20.6
-
-                # 计算偏转角度（以minAreaRect的angle为准，修正OpenCV角度定义）
-                angle = rect[2]
-                # OpenCV的angle定义：宽<高时，angle为与X轴夹角，宽>高时，angle+90
-                if wid_mm < ht_mm:
-                    rotation_angle = angle
-                else:
-                    rotation_angle = angle + 90
-                # 以Y轴为基准，偏转角度为90-rotation_angle
-                deviation_angle = 90 - rotation_angle
-
-                # 计算置信度
-                confidence = calculate_confidence(cnt, image.shape[:2])
-
-                cv2.putText(image, "{:.1f}mm".format(wid_mm), (int(mid_pt_horizontal[0] - 15), int(mid_pt_horizontal[1] - 10)), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
-                cv2.putText(image, "{:.1f}mm".format(ht_mm), (int(mid_pt_verticle[0] + 10), int(mid_pt_verticle[1])), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
-                # 标注偏转角度
-                cv2.putText(image, "Angle:{:.1f}".format(deviation_angle), (int(tl[0]), int(tl[1]) - 25),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
-                # 只在第一个轮廓左上角输出置信度
-                if idx == 0:
-                    cv2.putText(image, "Conf: {:.1%}".format(confidence), (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                    main_deviation_angle = deviation_angle  # 记录主对象偏转角度
-
-            # 保存处理后图片
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
-            processed_path = os.path.join(processed_dir, f"{base_name}_processed.jpg")
-            save_image(image, processed_path)
-
-            # 写入结果到txt文件（这里只写入文件名和处理图片路径，可根据需要扩展）
-            f.write(f"图像: {filename}\n")
-            f.write(f"处理后图片: {processed_path}\n")
-            # 可选：写入主对象的尺寸（以第一个cnt为例）
-            f.write(f"主对象宽度: {wid_mm:.1f} mm\n")
-            f.write(f"主对象高度: {ht_mm:.1f} mm\n")
-            f.write(f"主对象置信度: {confidence:.1%}\n")
-            f.write(f"主对象偏转角度: {main_deviation_angle:.1f} 度\n")
-            f.write("-" * 30 + "\n")
-            print(f"图像: {filename} 已处理并保存到 {processed_path}")
-
-print(f"结果已保存到: {result_file}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+尺寸测量结果写入
+
+每张图片的每个对象写一行（图片名、对象序号、是否参考物体、宽高mm、偏转角度、置信度、四个角点），
+逐张追加写入，下游统计直接按列读取，不需要再用正则解析中文文本。
+支持 txt（原有格式，只含主对象）、csv、jsonl 和 parquet（需要 pyarrow）。
+"""
+import os
+import csv
+import json
+import math
+import hashlib
+
+import numpy as np
+
+RESULT_FORMATS = ("txt", "csv", "jsonl", "parquet")
+
+# 结构化结果的列，box 展开为 x0,y0 ... x3,y3（角点顺序 tl, tr, br, bl）
+BOX_COLUMNS = [f"{axis}{i}" for i in range(4) for axis in ("x", "y")]
+# status: ok / rejected（画面预检查拒绝）/ failed（读取或检测失败）；slot: 托盘模式下的槽位名称；
+# reference: 该行为参考物体（未使用标定档案时每张图片的第一个对象，尺寸恒为参考宽度，统计零件时应排除）
+RESULT_COLUMNS = ["image", "processed", "status", "index", "reference", "slot", "width_mm", "height_mm", "angle",
+                  "confidence", *BOX_COLUMNS, "pixel_per_cm", "error"]
+
+
+def write_result_text(f, filename, processed_path, result):
+    """按原有格式写入主对象的测量结果，主对象为第一个零件（参考物体不算零件）"""
+    parts = result.parts
+    f.write(f"图像: {filename}\n")
+    f.write(f"处理后图片: {processed_path or '未保存'}\n")
+    if len(parts) == 0:
+        f.write("主对象: 未找到零件（只有参考物体）\n")
+    else:
+        main_obj = parts[0]
+        f.write(f"主对象宽度: {main_obj['width_mm']:.1f} mm\n")
+        f.write(f"主对象高度: {main_obj['height_mm']:.1f} mm\n")
+        f.write(f"主对象置信度: {main_obj['confidence']:.1%}\n")
+        f.write(f"主对象偏转角度: {main_obj['angle']:.1f} 度\n")
+    f.write("-" * 30 + "\n")
+
+def result_columns(filename, processed_path, result):
+    """
+    单张图片的结果转为列字典（每列一个等长列表/数组）。
+    测量失败或被预检查拒绝的图片输出一行 index=-1、数值为空、error 为原因，两者用 status 区分
+    """
+    records = result.records
+    if not result.ok or len(records) == 0:
+        columns = {name: [None] for name in RESULT_COLUMNS}
+        columns.update(image=[filename], processed=[processed_path], status=[result.status], index=[-1],
+                       reference=[False], error=[result.error])
+        return columns
+    n = len(records)
+    boxes = records["box"].reshape(n, 8)
+    columns = {
+        "image": [filename] * n,
+        "processed": [processed_path] * n,
+        "status": ["ok"] * n,
+        "index": records["index"].tolist(),
+        "reference": [result.reference] + [False] * (n - 1),
+        "slot": result.tray.slots if result.tray is not None else [None] * n,
+        "width_mm": records["width_mm"].tolist(),
+        "height_mm": records["height_mm"].tolist(),
+        "angle": records["angle"].tolist(),
+        "confidence": records["confidence"].tolist(),
+        "pixel_per_cm": [result.pixel_per_cm] * n,
+        "error": [None] * n,
+    }
+    for i, name in enumerate(BOX_COLUMNS):
+        columns[name] = boxes[:, i].tolist()
+    return columns
+
+
+class TextResultWriter:
+    """原有的中文文本格式，只写成功图片的主对象"""
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'a', encoding='utf-8')
+
+    def write(self, filename, processed_path, result):
+        if result.ok:
+            write_result_text(self.f, filename, processed_path, result)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class CsvResultWriter:
+    """
+    CSV，文件不存在时先写表头；追加模式打开，可在已有结果后继续写。
+    已有文件的表头与 RESULT_COLUMNS 不一致（旧版本写的文件）时报错，避免追加的行与表头错位
+    """
+    def __init__(self, path):
+        self.path = path
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new:
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                header = next(csv.reader(f), [])
+            if header != RESULT_COLUMNS:
+                raise ValueError(f"已有结果文件的列与当前版本不一致，无法追加: {path}")
+        # utf-8-sig 便于 Excel 直接打开中文文件名
+        self.f = open(path, 'a', encoding='utf-8-sig' if is_new else 'utf-8', newline='')
+        self.writer = csv.writer(self.f)
+        if is_new:
+            self.writer.writerow(RESULT_COLUMNS)
+
+    def write(self, filename, processed_path, result):
+        columns = result_columns(filename, processed_path, result)
+        self.writer.writerows(zip(*(columns[name] for name in RESULT_COLUMNS)))
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class JsonlResultWriter:
+    """JSON Lines，每个对象一行"""
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'a', encoding='utf-8')
+
+    def write(self, filename, processed_path, result):
+        columns = result_columns(filename, processed_path, result)
+        for row in zip(*(columns[name] for name in RESULT_COLUMNS)):
+            self.f.write(json.dumps(dict(zip(RESULT_COLUMNS, row)), ensure_ascii=False) + "\n")
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class ParquetResultWriter:
+    """
+    Parquet（需要 pip install pyarrow）。行先缓存在内存，满 row_group_size 行写出一个行组，
+    内存占用与行组大小有关而与总行数无关。Parquet 文件无法追加，已存在时报错。
+    """
+    def __init__(self, path, row_group_size=50000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("写入parquet需要安装pyarrow: pip install pyarrow")
+        if os.path.exists(path):
+            raise FileExistsError(f"parquet结果文件已存在，无法追加: {path}")
+        self.pa = pa
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = pa.schema(
+            [("image", pa.string()), ("processed", pa.string()), ("status", pa.string()), ("index", pa.int32()),
+             ("reference", pa.bool_()), ("slot", pa.string()), ("width_mm", pa.float64()), ("height_mm", pa.float64()), ("angle", pa.float64()),
+             ("confidence", pa.float64())]
+            + [(name, pa.int32()) for name in BOX_COLUMNS]
+            + [("pixel_per_cm", pa.float64()), ("error", pa.string())])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.buffer = {name: [] for name in RESULT_COLUMNS}
+        self.buffered = 0
+
+    def write(self, filename, processed_path, result):
+        columns = result_columns(filename, processed_path, result)
+        for name in RESULT_COLUMNS:
+            self.buffer[name].extend(columns[name])
+        self.buffered += len(columns["image"])
+        if self.buffered >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffered == 0:
+            return
+        table = self.pa.Table.from_pydict(self.buffer, schema=self.schema)
+        self.writer.write_table(table)
+        self.buffer = {name: [] for name in RESULT_COLUMNS}
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+RESULT_WRITERS = {
+    "txt": TextResultWriter,
+    "csv": CsvResultWriter,
+    "jsonl": JsonlResultWriter,
+    "parquet": ParquetResultWriter,
+}
+
+def open_result_writer(base_path, fmt="txt"):
+    """
+    打开结果写入器
+
+    Args:
+        base_path: 不含扩展名的结果文件路径
+        fmt: 见 RESULT_FORMATS
+    Returns:
+        写入器对象，提供 write(filename, processed_path, result) / flush() / close()，path 为文件路径
+    """
+    if fmt not in RESULT_WRITERS:
+        raise ValueError(f"不支持的结果格式: {fmt}")
+    return RESULT_WRITERS[fmt](f"{base_path}.{fmt}")
+
+def load_results(path):
+    """读取 csv/jsonl/parquet 结果为列字典 {列名: numpy数组}，便于统计分析"""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+    if path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        header = RESULT_COLUMNS
+        rows = [[row.get(name) for name in header] for row in rows]
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = list(reader)
+    columns = {}
+    for i, name in enumerate(header):
+        values = [row[i] for row in rows]
+        if name == "reference":
+            columns[name] = np.array([v in (True, "True") for v in values], dtype=bool)
+        elif name in ("image", "processed", "status", "slot", "error"):
+            columns[name] = np.array([v if v != "" else None for v in values], dtype=object)
+        else:
+            columns[name] = np.array([float(v) if v not in ("", None) else math.nan for v in values])
+    return columns
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """文件内容的 SHA-1"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RunManifest:
+    """
+    断点续跑清单（JSON Lines，只追加）。以 文件名 + 图片内容哈希 + 测量参数指纹 为键记录已处理的图片，
+    重新运行时只处理新增或内容变化的图片，参数或标定变化时全部重新测量。
+    另外缓存 文件名 → (大小, 修改时间, 哈希)，未变化的文件不必重新读取计算哈希。
+    无法解码的图片每次运行记一次读取失败，累计 max_read_retries 次后视为已处理，不再重试
+    （尚未写完的文件写完后哈希会变化，按新文件处理）。
+    """
+    def __init__(self, path, max_read_retries=3):
+        self.path = path
+        self.max_read_retries = max_read_retries
+        self.done = set()
+        self.read_failures = {}  # (文件名, 哈希, 指纹) → 读取失败次数
+        self.stat_cache = {}     # 文件名 → (大小, 修改时间, 哈希)，只保留最近一次
+        self.pending = []
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 中断时可能留下不完整的最后一行
+                        continue
+                    key = (entry["image"], entry["hash"], entry["fingerprint"])
+                    if entry.get("unreadable"):
+                        self._count_read_failure(key)
+                    else:
+                        self.done.add(key)
+                    self.stat_cache[entry["image"]] = (entry["size"], entry["mtime"], entry["hash"])
+
+    def image_hash(self, image_path):
+        st = os.stat(image_path)
+        name = os.path.basename(image_path)
+        cached = self.stat_cache.get(name)
+        if cached is None or cached[:2] != (st.st_size, st.st_mtime_ns):
+            cached = (st.st_size, st.st_mtime_ns, file_hash(image_path))
+            self.stat_cache[name] = cached
+        return cached[2]
+
+    def is_done(self, image_path, fingerprint):
+        return (os.path.basename(image_path), self.image_hash(image_path), fingerprint) in self.done
+
+    def prune(self, names):
+        """
+        只保留 names 中文件的当前内容的内存记录：去掉已移出目录的文件，以及同名文件被覆盖前的旧内容。
+        监视模式下内存只与目录中现存文件数有关；清单文件不变
+        """
+        self.stat_cache = {name: cached for name, cached in self.stat_cache.items() if name in names}
+        self.done = {key for key in self.done if self._is_current(key, names)}
+        self.read_failures = {key: n for key, n in self.read_failures.items() if self._is_current(key, names)}
+
+    def _is_current(self, key, names):
+        cached = self.stat_cache.get(key[0])
+        return key[0] in names and (cached is None or cached[2] == key[1])
+
+    def add(self, image_path, fingerprint, ok):
+        """记录一张已处理图片，flush() 之后才写入磁盘"""
+        self.done.add(self._append(image_path, fingerprint, {"ok": ok}))
+
+    def add_read_failure(self, image_path, fingerprint):
+        """记录一次读取失败，返回该图片累计失败次数；达到 max_read_retries 次后视为已处理"""
+        return self._count_read_failure(self._append(image_path, fingerprint, {"ok": False, "unreadable": True}))
+
+    def _count_read_failure(self, key):
+        n = self.read_failures.get(key, 0) + 1
+        self.read_failures[key] = n
+        if n >= self.max_read_retries:
+            self.done.add(key)
+        return n
+
+    def _append(self, image_path, fingerprint, fields):
+        st = os.stat(image_path)
+        digest = self.image_hash(image_path)
+        name = os.path.basename(image_path)
+        self.pending.append({"image": name, "size": st.st_size, "mtime": st.st_mtime_ns, "hash": digest,
+                             "fingerprint": fingerprint, **fields})
+        return name, digest, fingerprint
+
+    def flush(self):
+        """在结果文件 flush 之后调用，保证清单中的图片结果已落盘（中断时最多重复测量，不会丢结果）"""
+        if not self.pending:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in self.pending:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.pending = []
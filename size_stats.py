@@ -0,0 +1,143 @@
+"""
+测量流程的分阶段计时和计数
+
+默认关闭，stage()/count() 只做一次全局变量判断，不影响正常测量速度。
+start_image() 之后到 finish_image() 之前，size_object 各阶段（读取解码、模糊、Canny、形态学、
+findContours、过滤排序、测量、绘制、编码写入、后台写入队列等待等）的耗时和计数（找到/保留的轮廓数、写入字节数）
+累加到当前图片的 ImageStats 中。每个进程各自记录，工作进程随测量结果一起返回。
+后台线程写入标注图片（size_writer.ImageWriter）时，编码写入耗时和写入字节数不属于某张图片的记录，
+运行结束时由 ImageWriter.add_to_stats() 计入汇总。
+
+    from size_stats import RunStats
+    run = RunStats("stage_stats.jsonl")
+    ... run.add(filename, result.stats) ...
+    run.close(); run.print_summary()
+"""
+import json
+import time
+
+# 阶段显示顺序，未列出的阶段排在最后
+STAGE_ORDER = ("decode", "lens_remap", "precheck", "pyramid_resize", "gray_blur", "canny", "morphology",
+               "find_contours", "filter_sort", "measure", "draw", "write_queue", "encode_write",
+               "write_results")
+
+_current = None
+
+
+class ImageStats:
+    """单张图片的各阶段耗时(秒)和计数"""
+    __slots__ = ("times", "counts")
+
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+
+    def as_dict(self):
+        return {"times_ms": {k: round(v * 1000, 3) for k, v in self.times.items()}, "counts": dict(self.counts)}
+
+
+class _StageTimer:
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        times = self.stats.times
+        times[self.name] = times.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+def stage(name):
+    """阶段计时上下文：with stage("canny"): ...；未开启统计时不计时"""
+    if _current is None:
+        return _NO_TIMER
+    return _StageTimer(_current, name)
+
+def count(name, n=1):
+    """累加计数；未开启统计时忽略"""
+    if _current is not None:
+        _current.counts[name] = _current.counts.get(name, 0) + int(n)
+
+def start_image():
+    """开始记录一张图片（同一进程内同时只记录一张）"""
+    global _current
+    _current = ImageStats()
+    return _current
+
+def finish_image():
+    """结束记录，返回当前图片的 ImageStats（未开始时返回None）"""
+    global _current
+    stats, _current = _current, None
+    return stats
+
+
+class RunStats:
+    """汇总整次运行的分阶段统计，并把每张图片的记录逐行写入 JSON Lines 文件"""
+    def __init__(self, path=None):
+        self.path = path
+        self.f = open(path, 'a', encoding='utf-8') if path else None
+        self.times = {}
+        self.counts = {}
+        self.images = 0
+
+    def add(self, filename, stats):
+        """stats 为 ImageStats 或 None（例如图片读取失败）"""
+        if stats is None:
+            return
+        self.images += 1
+        for k, v in stats.times.items():
+            self.times[k] = self.times.get(k, 0.0) + v
+        for k, v in stats.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + v
+        if self.f is not None:
+            self.f.write(json.dumps({"image": filename, **stats.as_dict()}, ensure_ascii=False) + "\n")
+
+    def add_time(self, name, seconds):
+        """主进程中的阶段（如写结果文件），只计入汇总"""
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def add_count(self, name, n):
+        """不属于某张图片的计数（如后台写入线程的写入字节数），只计入汇总"""
+        self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def print_summary(self):
+        if not self.images:
+            return
+        total = sum(self.times.values())
+        order = {name: i for i, name in enumerate(STAGE_ORDER)}
+        print(f"分阶段耗时（{self.images} 张图片，多进程时为各进程累计）:")
+        for name in sorted(self.times, key=lambda k: (order.get(k, len(order)), k)):
+            t = self.times[name]
+            share = t / total if total > 0 else 0.0
+            print(f"  {name:<15} 合计 {t:8.3f} 秒  平均 {t / self.images * 1000:8.2f} ms/张  占比 {share:6.1%}")
+        if self.counts:
+            print("计数: " + "，".join(f"{k}={v}" for k, v in sorted(self.counts.items())))
+        if self.path:
+            print(f"每张图片的统计已保存到: {self.path}")
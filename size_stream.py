@@ -0,0 +1,323 @@
+"""
+视频/相机流尺寸测量
+
+逐帧读取视频文件或相机流，每帧用 size_object 的测量流程检测零件，
+按中心点（加上估计的移动速度）把检测结果与已有轨迹关联，同一个零件在多帧中只输出一次：
+零件完整出现在画面内（测量框不接触画面边缘）的各帧尺寸取中位数，离开画面后写入结果文件。
+
+使用标定档案时可用 --full-every N 每 N 个检测帧才做一次整帧检测，其余检测帧只在已有轨迹的预测位置附近
+（上次测量框按速度平移后外扩 max_distance）做边缘检测和测量。新进入画面的零件要等下一次整帧检测才开始跟踪，
+N 应远小于零件穿过画面的帧数。未使用档案时每帧都需要整帧找参考物体，始终整帧检测。
+
+建议使用标定档案（传送带上不一定总有参考物体）；未使用档案时每帧最左侧物体为参考物体，不参与跟踪。
+大图可配合 --pyramid、--full-every 或 --stride（每隔几帧检测一次）在单核上跟上相机帧率。
+
+用法:
+    python size_stream.py --input conveyor.mp4 --profile station1 --format csv
+    python size_stream.py --input conveyor.mp4 --profile station1 --full-every 5
+    python size_stream.py --camera 0 --profile station1
+"""
+import os
+import sys
+import time
+import argparse
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+
+import cv2
+import numpy as np
+
+from size_calibration import FixtureROI
+from size_object import (MEASUREMENT_DTYPE, RESULTS_DIRECTORY, ImageMeasurement, MeasureParams, measure_image)
+from size_results import RESULT_FORMATS, open_result_writer
+
+
+@dataclass
+class Track:
+    """一个零件在连续帧中的轨迹"""
+    track_id: int
+    center: np.ndarray              # 最近一次的中心点 (x, y)
+    first_frame: int
+    last_frame: int
+    velocity: np.ndarray = field(default_factory=lambda: np.zeros(2))  # 每帧位移估计
+    missed: int = 0                 # 连续未匹配的帧数
+    box: np.ndarray = None          # 最近一次完整可见时的测量框
+    widths: List[float] = field(default_factory=list)
+    heights: List[float] = field(default_factory=list)
+    angles: List[float] = field(default_factory=list)
+    confidences: List[float] = field(default_factory=list)
+
+    @property
+    def hits(self):
+        """完整可见（参与尺寸统计）的帧数"""
+        return len(self.widths)
+
+
+class PartTracker:
+    """
+    最近邻轨迹关联：预测位置 = 上次中心 + 速度 × 距该轨迹上次匹配的帧数，预测点与检测点距离小于 max_distance 才关联，
+    所有候选对按距离从小到大贪心匹配。连续 max_missed 帧未出现的轨迹结束，
+    完整可见帧数不少于 min_hits 的轨迹作为一个零件输出
+    """
+    def __init__(self, max_distance=80.0, max_missed=5, min_hits=3, border=2):
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.border = border
+        self.tracks: List[Track] = []
+        self.next_id = 0
+
+    def predicted_regions(self, frame_index, frame_size):
+        """
+        已有轨迹在 frame_index 帧的预测区域：上次完整可见的测量框按速度平移后外扩 max_distance，裁剪到画面内。
+
+        Returns:
+            [(x0, y0, x1, y1)]；有轨迹还没有完整可见的测量框（刚进入画面）时返回None，需要整帧检测
+        """
+        h, w = frame_size
+        regions = []
+        for track in self.tracks:
+            if track.box is None:
+                return None
+            box = track.box + track.velocity * (frame_index - track.last_frame)
+            x0, y0 = np.floor(box.min(axis=0) - self.max_distance).astype(int)
+            x1, y1 = np.ceil(box.max(axis=0) + self.max_distance).astype(int) + 1
+            x0, y0, x1, y1 = max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+            if x1 > x0 and y1 > y0:
+                regions.append((int(x0), int(y0), int(x1), int(y1)))
+        return regions
+
+    def update(self, frame_index, records, frame_size):
+        """
+        Args:
+            records: 本帧零件的 MEASUREMENT_DTYPE 测量记录（不含参考物体）
+            frame_size: (高, 宽)
+        Returns:
+            本帧结束的轨迹列表（已过滤 min_hits）
+        """
+        centers = records["box"].astype(np.float64).mean(axis=1) if len(records) else np.zeros((0, 2))
+        h, w = frame_size
+        boxes = records["box"]
+        full = ((boxes[:, :, 0].min(axis=1) > self.border) & (boxes[:, :, 1].min(axis=1) > self.border) &
+                (boxes[:, :, 0].max(axis=1) < w - 1 - self.border) &
+                (boxes[:, :, 1].max(axis=1) < h - 1 - self.border)) if len(records) else np.zeros(0, bool)
+
+        matched_tracks = set()
+        matched_dets = set()
+        if self.tracks and len(records):
+            # 每条轨迹按距自身上次匹配的帧数预测；漏检几帧后按全局检测间隔预测会偏短
+            gaps = np.array([frame_index - t.last_frame for t in self.tracks], dtype=np.float64)
+            predicted = np.array([t.center + t.velocity * gap for t, gap in zip(self.tracks, gaps)])
+            dist = np.linalg.norm(predicted[:, None, :] - centers[None, :, :], axis=2)
+            for flat in np.argsort(dist, axis=None):
+                ti, di = divmod(int(flat), len(records))
+                if dist[ti, di] > self.max_distance:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+                track = self.tracks[ti]
+                track.velocity = (centers[di] - track.center) / gaps[ti]
+                track.center = centers[di]
+                track.last_frame = frame_index
+                track.missed = 0
+                self._observe(track, records[di], full[di])
+
+        finished = []
+        alive = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    finished.append(track)
+                    continue
+            alive.append(track)
+        for di in range(len(records)):
+            if di not in matched_dets:
+                track = Track(self.next_id, centers[di], frame_index, frame_index)
+                self.next_id += 1
+                self._observe(track, records[di], full[di])
+                alive.append(track)
+        self.tracks = alive
+        return [t for t in finished if t.hits >= self.min_hits]
+
+    def flush(self):
+        """结束所有轨迹（视频结束时调用）"""
+        finished = [t for t in self.tracks if t.hits >= self.min_hits]
+        self.tracks = []
+        return finished
+
+    @staticmethod
+    def _observe(track, record, fully_visible):
+        # 进出画面时只看到零件的一部分，这些帧的尺寸不参与统计
+        if not fully_visible:
+            return
+        track.widths.append(float(record["width_mm"]))
+        track.heights.append(float(record["height_mm"]))
+        track.angles.append(float(record["angle"]))
+        track.confidences.append(float(record["confidence"]))
+        track.box = record["box"].copy()
+
+
+def track_measurement(track, frame_size, pixel_per_cm):
+    """把轨迹汇总为一条测量记录（index 为轨迹编号，尺寸取各帧中位数）"""
+    records = np.zeros(1, dtype=MEASUREMENT_DTYPE)
+    records[0] = (track.track_id, np.median(track.widths), np.median(track.heights), np.median(track.angles),
+                  np.mean(track.confidences), track.box)
+    return ImageMeasurement(image_size=frame_size, pixel_per_cm=pixel_per_cm, records=records)
+
+def measure_regions(frame, params, profile, regions, border=2):
+    """
+    只在给定区域内测量（使用标定档案），去掉接触区域边缘（画面边缘除外）的不完整对象，
+    相邻区域重叠时同一个对象只保留一次
+
+    Returns:
+        MEASUREMENT_DTYPE 测量记录
+    """
+    h, w = frame.shape[:2]
+    found = []
+    for x0, y0, x1, y1 in regions:
+        result = measure_image(frame, params, profile, FixtureROI.from_rects([(x0, y0, x1 - x0, y1 - y0)]))
+        if not result.ok:
+            continue
+        boxes = result.records["box"]
+        inside = (((boxes[:, :, 0].min(axis=1) > x0 + border) | (x0 == 0)) &
+                  ((boxes[:, :, 1].min(axis=1) > y0 + border) | (y0 == 0)) &
+                  ((boxes[:, :, 0].max(axis=1) < x1 - 1 - border) | (x1 == w)) &
+                  ((boxes[:, :, 1].max(axis=1) < y1 - 1 - border) | (y1 == h)))
+        found.append(result.records[inside])
+    if not found:
+        return np.zeros(0, dtype=MEASUREMENT_DTYPE)
+    records = np.concatenate(found)
+    _, first = np.unique(records["box"].reshape(len(records), -1), axis=0, return_index=True)
+    return records[np.sort(first)]
+
+def measure_stream(capture, params=None, profile=None, roi=None, stride=1, tracker=None, on_part=None,
+                   max_frames=None, full_every=1):
+    """
+    逐帧测量并跟踪零件
+
+    Args:
+        capture: cv2.VideoCapture
+        stride: 每隔几帧检测一次，其余帧只 grab 不解码像素
+        tracker: PartTracker，默认 PartTracker()
+        on_part: 回调 on_part(track, ImageMeasurement)，每个零件离开画面（或视频结束）时调用一次
+        max_frames: 最多读取的帧数
+        full_every: 使用标定档案且未指定 roi 时，每隔几个检测帧做一次整帧检测，其余检测帧只测量已有轨迹的预测区域；
+                    有轨迹刚进入画面（还没有完整测量框）时仍整帧检测
+    Returns:
+        (读取帧数, 检测帧数, 零件数)
+    """
+    if tracker is None:
+        tracker = PartTracker()
+    detected = 0
+    parts = 0
+    pixel_per_cm = profile.pixel_per_cm if profile is not None else None
+    frame_size = None
+
+    def emit(tracks):
+        nonlocal parts
+        for track in tracks:
+            parts += 1
+            if on_part is not None:
+                on_part(track, track_measurement(track, frame_size, pixel_per_cm))
+
+    frames = 0
+    try:
+        while max_frames is None or frames < max_frames:
+            frame_index = frames
+            if frame_index % stride:
+                # 跳过的帧只 grab，不做像素解码
+                if not capture.grab():
+                    break
+                frames += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames += 1
+            frame_size = frame.shape[:2]
+            regions = None
+            if profile is not None and roi is None and detected % max(1, full_every):
+                regions = tracker.predicted_regions(frame_index, frame_size)
+            detected += 1
+            if regions is not None:
+                emit(tracker.update(frame_index, measure_regions(frame, params, profile, regions), frame_size))
+                continue
+            result = measure_image(frame, params, profile, roi)
+            records = result.records if result.ok else np.zeros(0, dtype=MEASUREMENT_DTYPE)
+            if result.ok and profile is None:
+                # 未使用标定档案时第一个对象为参考物体
+                records = records[1:]
+                pixel_per_cm = result.pixel_per_cm
+            emit(tracker.update(frame_index, records, frame_size))
+    except KeyboardInterrupt:
+        print("已停止读取视频流")
+    if frame_size is not None:
+        emit(tracker.flush())
+    return frames, detected, parts
+
+def main():
+    parser = argparse.ArgumentParser(description='视频/相机流尺寸测量（零件跨帧跟踪，每个零件输出一次）')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--input', '-i', help='视频文件路径')
+    source.add_argument('--camera', type=int, help='相机编号')
+    parser.add_argument('--results', '-r', default=RESULTS_DIRECTORY, help='结果文件输出文件夹路径')
+    parser.add_argument('--format', '-f', choices=RESULT_FORMATS, default='csv', help='结果文件格式，默认csv')
+    parser.add_argument('--profile', help='标定档案名称（建议使用）')
+    parser.add_argument('--profile-dir', help='标定档案文件夹路径，默认见 size_calibration.py')
+    parser.add_argument('--roi', help='治具ROI名称，只处理ROI区域')
+    parser.add_argument('--pyramid', type=int, default=0, help='金字塔粗检层数，大图可设为1或2')
+    parser.add_argument('--stride', type=int, default=1, help='每隔几帧检测一次，默认每帧检测')
+    parser.add_argument('--full-every', type=int, default=1,
+                        help='使用标定档案时每隔几个检测帧做一次整帧检测，其余检测帧只测量已有零件的预测区域；默认每帧整帧检测')
+    parser.add_argument('--max-distance', type=float, default=80.0, help='相邻检测帧间零件中心最大位移(像素)')
+    parser.add_argument('--max-missed', type=int, default=5, help='连续多少个检测帧未出现视为离开画面')
+    parser.add_argument('--min-hits', type=int, default=3, help='完整可见帧数少于该值的轨迹不输出')
+    parser.add_argument('--max-frames', type=int, help='最多处理的帧数')
+    args = parser.parse_args()
+
+    from size_calibration import CALIBRATION_DIRECTORY, load_profile, load_roi
+    profile_dir = args.profile_dir or CALIBRATION_DIRECTORY
+    try:
+        profile = load_profile(args.profile, profile_dir) if args.profile else None
+        roi = load_roi(args.roi, profile_dir) if args.roi else None
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
+
+    capture = cv2.VideoCapture(args.input if args.input else args.camera)
+    if not capture.isOpened():
+        print(f"无法打开视频: {args.input if args.input else args.camera}")
+        sys.exit(1)
+    source_name = os.path.basename(args.input) if args.input else f"camera{args.camera}"
+
+    os.makedirs(args.results, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    writer = open_result_writer(os.path.join(args.results, f"stream_results_{timestamp}"), args.format)
+    params = MeasureParams(pyramid_levels=args.pyramid)
+    tracker = PartTracker(args.max_distance * max(1, args.stride), args.max_missed, args.min_hits)
+
+    def on_part(track, result):
+        obj = result.objects[0]
+        print(f"零件 #{track.track_id}: 帧 {track.first_frame}-{track.last_frame}，"
+              f"宽 {obj.width_mm:.1f} mm，高 {obj.height_mm:.1f} mm（{track.hits} 帧）")
+        writer.write(f"{source_name}@{track.first_frame}-{track.last_frame}", None, result)
+        writer.flush()
+
+    start = time.perf_counter()
+    try:
+        frames, detected, parts = measure_stream(capture, params, profile, roi, max(1, args.stride), tracker,
+                                                 on_part, args.max_frames, args.full_every)
+    finally:
+        capture.release()
+        writer.close()
+    elapsed = time.perf_counter() - start
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    print(f"结果已保存到: {writer.path}")
+    print(f"共读取 {frames} 帧（检测 {detected} 帧），{parts} 个零件，耗时 {elapsed:.2f} 秒，{fps:.1f} 帧/秒")
+
+if __name__ == "__main__":
+    main()
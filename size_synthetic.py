@@ -0,0 +1,314 @@
+"""
+合成测试图片与真值
+
+按物理尺寸(mm)生成场景：最左侧为已知宽度的方形参考物体，右侧为若干已知尺寸的旋转矩形零件，
+可叠加高斯噪声、表面纹理、模糊和光照渐变。同一组参数在任意分辨率下描述同一个物理场景，
+便于比较不同分辨率、参数或算法下的测量误差。真值以 JSON 保存：
+
+    {"图片文件名": [{"center": [x, y], "width_mm": .., "height_mm": .., "angle": .., "reference": true}, ...]}
+
+实拍图片的真值可以只写零件尺寸（不含 center），评估时按尺寸最接近的对象匹配。
+
+center 为像素坐标，width_mm/height_mm 为实际尺寸（宽 >= 高）。测量时使用 mm_scale=10
+（1cm = 10mm），测得的 width_mm/height_mm 即为实际毫米数，可直接与真值比较；
+用其他 mm_scale 测量时把同一个 mm_scale 传给 match_truth/dimension_errors，测得尺寸换算为毫米后再比较。
+
+--video 生成传送带视频（零件从左向右匀速移动，无参考物体），用于测试 size_stream.py 的跨帧跟踪，
+真值为按进入画面顺序排列的零件列表，同时生成对应的标定档案。
+
+用法:
+    python size_synthetic.py --output C:\\Users\\LHB\\Pictures\\Synthetic --count 50 --width 2560
+    python size_synthetic.py --output C:\\Users\\LHB\\Pictures\\Synthetic --video 300 --width 1280
+"""
+import os
+import json
+import argparse
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from size_object import MeasureParams, save_image
+
+GROUND_TRUTH_FILE = "ground_truth.json"
+CONVEYOR_VIDEO_FILE = "conveyor.avi"
+
+
+@dataclass
+class SceneSpec:
+    """合成场景的物理参数，尺寸单位为mm"""
+    field_width_mm: float = 256     # 画面对应的物理宽度，高度按图片宽高比换算
+    ref_width_cm: float = 2         # 参考物体边长，与 MeasureParams.ref_width_cm 一致
+    parts: int = 12
+    min_part_mm: float = 8
+    max_part_mm: float = 30
+    gap_mm: float = 3               # 零件之间、零件与画面边缘的最小间距
+    background: int = 225
+    foreground: int = 40
+    noise_sigma: float = 4          # 高斯噪声标准差（灰度）
+    blur_mm: float = 0              # 高斯模糊 sigma（mm），模拟失焦
+    gradient: float = 0             # 光照渐变强度，0~1，画面一侧亮度乘以 1-gradient
+    texture: float = 0              # 表面纹理（低频随机起伏）的灰度标准差，模拟木纹、纸张、磨砂治具等背景
+    texture_mm: float = 0.5         # 纹理颗粒尺寸（mm）
+
+
+def truth_params(**kwargs):
+    """与合成真值对应的测量参数：mm_scale=10 时输出即为毫米"""
+    return MeasureParams(mm_scale=10, **kwargs)
+
+def make_synthetic_scene(width=2560, height=1920, spec=None, seed=0):
+    """
+    生成合成图片及真值
+
+    Args:
+        width, height: 图片像素尺寸
+        spec: SceneSpec，默认 SceneSpec()
+        seed: 随机种子，同一种子在不同分辨率下生成同一个物理场景
+    Returns:
+        (BGR图像, 真值列表)，真值第一项为参考物体
+    """
+    if spec is None:
+        spec = SceneSpec()
+    rng = np.random.default_rng(seed)
+    px_per_mm = width / spec.field_width_mm
+    field_h_mm = height / px_per_mm
+    ref_mm = spec.ref_width_cm * 10
+
+    # 参考物体固定在左侧中部，零件全部放在其右侧，保证参考物体是最左侧的轮廓
+    ref_x = spec.gap_mm + ref_mm / 2
+    shapes = [((ref_x, field_h_mm / 2), (ref_mm, ref_mm), 0.0, True)]
+    placed = [(ref_x, field_h_mm / 2, ref_mm / np.sqrt(2))]
+    x_min = ref_x + ref_mm / 2 + spec.gap_mm
+    for _ in range(spec.parts * 50):
+        if len(shapes) > spec.parts:
+            break
+        w, h = sorted(rng.uniform(spec.min_part_mm, spec.max_part_mm, 2), reverse=True)
+        r = np.hypot(w, h) / 2
+        cx = rng.uniform(x_min + r, spec.field_width_mm - spec.gap_mm - r)
+        cy = rng.uniform(spec.gap_mm + r, field_h_mm - spec.gap_mm - r)
+        angle = float(rng.uniform(0, 180))
+        # 外接圆不相交即可保证零件互不接触（含间距）
+        if any(np.hypot(cx - px, cy - py) < r + pr + spec.gap_mm for px, py, pr in placed):
+            continue
+        placed.append((cx, cy, r))
+        shapes.append(((float(cx), float(cy)), (float(w), float(h)), angle, False))
+
+    image = np.full((height, width), spec.background, np.uint8)
+    polys = []
+    truths = []
+    shift = 4  # fillPoly 亚像素精度 1/16 像素
+    for (cx, cy), (w, h), angle, is_ref in shapes:
+        center = (cx * px_per_mm, cy * px_per_mm)
+        box = cv2.boxPoints((center, (w * px_per_mm, h * px_per_mm), angle))
+        polys.append(np.round(box * (1 << shift)).astype(np.int32))
+        truths.append({"center": [round(center[0], 2), round(center[1], 2)],
+                       "width_mm": round(float(w), 3), "height_mm": round(float(h), 3),
+                       "angle": round(angle, 2), "reference": is_ref})
+    # 抗锯齿只对8位图像生效，先画再转浮点叠加渐变/模糊/噪声
+    cv2.fillPoly(image, polys, spec.foreground, cv2.LINE_AA, shift)
+    image = image.astype(np.float32)
+
+    if spec.texture > 0:
+        texture = cv2.GaussianBlur(rng.standard_normal(image.shape, dtype=np.float32), (0, 0),
+                                   spec.texture_mm * px_per_mm)
+        image += texture * (spec.texture / max(float(texture.std()), 1e-6))
+    if spec.gradient > 0:
+        ramp = np.linspace(1.0, 1.0 - spec.gradient, width, dtype=np.float32)
+        image *= ramp[None, :]
+    if spec.blur_mm > 0:
+        image = cv2.GaussianBlur(image, (0, 0), spec.blur_mm * px_per_mm)
+    if spec.noise_sigma > 0:
+        image += rng.normal(0, spec.noise_sigma, image.shape).astype(np.float32)
+    image = np.clip(image, 0, 255).astype(np.uint8)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR), truths
+
+def render_shapes(width, height, shapes, spec, px_per_mm, rng):
+    """按 (中心mm, 尺寸mm, 角度) 绘制前景并叠加噪声，返回灰度图"""
+    image = np.full((height, width), spec.background, np.uint8)
+    shift = 4
+    polys = [np.round(cv2.boxPoints(((cx * px_per_mm, cy * px_per_mm), (w * px_per_mm, h * px_per_mm), angle))
+                      * (1 << shift)).astype(np.int32) for (cx, cy), (w, h), angle in shapes]
+    if polys:
+        cv2.fillPoly(image, polys, spec.foreground, cv2.LINE_AA, shift)
+    if spec.noise_sigma > 0:
+        noise = rng.normal(0, spec.noise_sigma, image.shape).astype(np.float32)
+        image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    return image
+
+def make_conveyor_video(path, frames=300, width=1280, height=960, spec=None, speed_mm=4.0, fps=30, seed=0):
+    """
+    生成传送带视频：零件从画面左侧外进入，每帧向右移动 speed_mm，互不接触，画面中无参考物体
+
+    Returns:
+        (真值列表, 像素/cm)。真值按进入画面顺序排列，只包含完全进入过画面的零件，
+        full_frames 为零件外接圆完全在画面内的帧数
+    """
+    if spec is None:
+        spec = SceneSpec()
+    rng = np.random.default_rng(seed)
+    px_per_mm = width / spec.field_width_mm
+    field_h_mm = height / px_per_mm
+    travel = frames * speed_mm
+    parts = []
+    x = 0.0
+    while True:
+        w, h = sorted(rng.uniform(spec.min_part_mm, spec.max_part_mm, 2), reverse=True)
+        r = np.hypot(w, h) / 2
+        # 相邻零件沿运动方向间隔大于两者外接圆直径，任意纵向位置都不会接触
+        x -= r + spec.gap_mm + rng.uniform(0, spec.max_part_mm)
+        if x + travel < -r:
+            break
+        cy = rng.uniform(spec.gap_mm + r, field_h_mm - spec.gap_mm - r)
+        parts.append({"x0": float(x), "cy": float(cy), "r": float(r), "width_mm": round(float(w), 3),
+                      "height_mm": round(float(h), 3), "angle": round(float(rng.uniform(0, 180)), 2)})
+        x -= r
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"无法写入视频: {path}")
+    try:
+        for k in range(frames):
+            shapes = []
+            for part in parts:
+                cx = part["x0"] + k * speed_mm
+                if -part["r"] < cx < spec.field_width_mm + part["r"]:
+                    shapes.append(((cx, part["cy"]), (part["width_mm"], part["height_mm"]), part["angle"]))
+            writer.write(cv2.cvtColor(render_shapes(width, height, shapes, spec, px_per_mm, rng), cv2.COLOR_GRAY2BGR))
+    finally:
+        writer.release()
+
+    truths = []
+    for part in parts:
+        # 外接圆完全在画面内的帧区间
+        first = int(np.ceil((part["r"] - part["x0"]) / speed_mm))
+        last = min(frames - 1, int(np.floor((spec.field_width_mm - part["r"] - part["x0"]) / speed_mm)))
+        if last >= first and first < frames:
+            truths.append({"width_mm": part["width_mm"], "height_mm": part["height_mm"], "angle": part["angle"],
+                           "full_frames": last - first + 1})
+    return truths, px_per_mm * 10
+
+def save_ground_truth(truth, path):
+    """保存真值 {文件名: 真值列表}"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(truth, f, ensure_ascii=False, indent=1)
+
+def load_ground_truth(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def match_truth(result, truths, max_distance=None, skip_reference=True, mm_scale=10, max_size_error=None):
+    """
+    按中心点把测量对象与真值一一匹配（参考物体除外），每个真值取最近的未匹配对象。
+    真值没有 center（只知道每张图片应有的零件尺寸）时，按 (长边, 短边) 尺寸取最接近的未匹配对象，
+    长短边平均误差超过 max_size_error 时视为漏检（否则噪声小轮廓、背景大轮廓也会被当作检测到）
+
+    Args:
+        result: ImageMeasurement
+        truths: 真值列表
+        max_distance: 中心点最大距离(像素)，默认为真值对角线的一半；按尺寸匹配时不限制
+        skip_reference: 第一个对象为参考物体，不参与匹配（使用标定档案测量时为False）
+        mm_scale: 测量时的 MeasureParams.mm_scale，按尺寸匹配时测得尺寸乘以 10/mm_scale 换算为毫米
+        max_size_error: 按尺寸匹配时允许的长短边平均绝对误差(mm)，None 时不限制
+    Returns:
+        [(真值, 测量记录或None)]，测量记录为 MEASUREMENT_DTYPE 的一行
+    """
+    parts = [t for t in truths if not t.get("reference")]
+    records = result.records if result.ok else result.records[:0]
+    centers = records["box"].astype(np.float64).mean(axis=1) if len(records) else np.zeros((0, 2))
+    dims = -np.sort(-np.stack([records["width_mm"], records["height_mm"]], axis=1), axis=1) * (10 / mm_scale)
+    used = np.zeros(len(records), dtype=bool)
+    if len(records) and skip_reference:
+        used[0] = True
+    pairs = []
+    for t in parts:
+        if used.all():
+            pairs.append((t, None))
+            continue
+        if "center" not in t:
+            expected = sorted((t["width_mm"], t["height_mm"]), reverse=True)
+            d = np.abs(dims - expected).mean(axis=1)
+            d[used] = np.inf
+            i = int(np.argmin(d))
+            if max_size_error is not None and d[i] > max_size_error:
+                pairs.append((t, None))
+                continue
+            used[i] = True
+            pairs.append((t, records[i]))
+            continue
+        d = np.linalg.norm(centers - np.asarray(t["center"]), axis=1)
+        d[used] = np.inf
+        i = int(np.argmin(d))
+        limit = max_distance
+        if limit is None:
+            # 真值中心附近的对象才算检测到，按像素/mm 换算真值对角线
+            px_per_mm = result.pixel_per_cm / 10 if result.pixel_per_cm else 0
+            limit = 0.5 * np.hypot(t["width_mm"], t["height_mm"]) * px_per_mm
+        if d[i] <= limit:
+            used[i] = True
+            pairs.append((t, records[i]))
+        else:
+            pairs.append((t, None))
+    return pairs
+
+def dimension_errors(pairs, mm_scale=10):
+    """
+    匹配结果的尺寸误差(mm)。测量的宽高方向与真值不一定一致，按长边、短边分别比较；
+    mm_scale 为测量时的 MeasureParams.mm_scale，测得尺寸乘以 10/mm_scale 换算为毫米
+
+    Returns:
+        (误差数组 (N,2) [长边误差, 短边误差]（带符号，测量值-真值）, 检测到的零件数, 真值零件数)
+    """
+    errors = []
+    for t, rec in pairs:
+        if rec is None:
+            continue
+        measured = sorted((float(rec["width_mm"]) * 10 / mm_scale, float(rec["height_mm"]) * 10 / mm_scale),
+                          reverse=True)
+        errors.append((measured[0] - t["width_mm"], measured[1] - t["height_mm"]))
+    return np.array(errors, dtype=np.float64).reshape(-1, 2), len(errors), len(pairs)
+
+def main():
+    parser = argparse.ArgumentParser(description='生成带真值的合成测试图片')
+    parser.add_argument('--output', '-o', required=True, help='输出文件夹，图片和 ground_truth.json 写入其中')
+    parser.add_argument('--count', '-n', type=int, default=20, help='图片数量')
+    parser.add_argument('--width', type=int, default=2560, help='图片宽度(像素)')
+    parser.add_argument('--height', type=int, help='图片高度(像素)，默认宽度的3/4')
+    parser.add_argument('--parts', type=int, default=SceneSpec.parts, help='每张图片的零件数')
+    parser.add_argument('--noise', type=float, default=SceneSpec.noise_sigma, help='噪声标准差(灰度)')
+    parser.add_argument('--blur', type=float, default=SceneSpec.blur_mm, help='模糊 sigma(mm)')
+    parser.add_argument('--gradient', type=float, default=SceneSpec.gradient, help='光照渐变强度 0~1')
+    parser.add_argument('--texture', type=float, default=SceneSpec.texture, help='表面纹理灰度标准差')
+    parser.add_argument('--seed', type=int, default=0, help='起始随机种子')
+    parser.add_argument('--video', type=int, help='生成指定帧数的传送带视频(conveyor.avi)代替图片')
+    parser.add_argument('--speed', type=float, default=4.0, help='--video 零件每帧移动距离(mm)')
+    args = parser.parse_args()
+
+    height = args.height or args.width * 3 // 4
+    spec = SceneSpec(parts=args.parts, noise_sigma=args.noise, blur_mm=args.blur, gradient=args.gradient,
+                     texture=args.texture)
+    os.makedirs(args.output, exist_ok=True)
+    if args.video:
+        from size_calibration import CalibrationProfile, save_profile
+        video_path = os.path.join(args.output, CONVEYOR_VIDEO_FILE)
+        truths, pixel_per_cm = make_conveyor_video(video_path, args.video, args.width, height, spec, args.speed,
+                                                   seed=args.seed)
+        save_ground_truth({CONVEYOR_VIDEO_FILE: truths}, os.path.join(args.output, GROUND_TRUTH_FILE))
+        profile = CalibrationProfile(name="synthetic_conveyor", pixel_per_cm=pixel_per_cm, mm_scale=10,
+                                     image_size=(height, args.width), ref_width_cm=spec.ref_width_cm)
+        save_profile(profile, args.output)
+        print(f"已生成 {args.video} 帧 {args.width}x{height} 传送带视频: {video_path}，{len(truths)} 个零件")
+        print(f"测量: python size_stream.py --input {video_path} --profile {profile.name} --profile-dir {args.output}")
+        return
+    truth = {}
+    for i in range(args.count):
+        image, truths = make_synthetic_scene(args.width, height, spec, seed=args.seed + i)
+        filename = f"synthetic_{args.seed + i:04d}.jpg"
+        save_image(image, os.path.join(args.output, filename))
+        truth[filename] = truths
+    path = os.path.join(args.output, GROUND_TRUTH_FILE)
+    save_ground_truth(truth, path)
+    print(f"已生成 {args.count} 张 {args.width}x{height} 合成图片，真值保存到: {path}")
+    print("测量时请使用 mm_scale=10，测得尺寸即为毫米")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+标注图片的后台编码写入
+
+主循环把标注好的图像交给 ImageWriter 后立即测量下一张，编码（cv2.imencode 释放 GIL）和写盘
+在后台线程中进行。队列有上限：写盘跟不上时 submit() 阻塞等待，内存中最多保留 max_pending 张待写图像。
+SyncImageWriter 接口相同但同步写入，可以传给进程池中的工作进程。
+
+    from size_writer import ImageWriter
+    writer = ImageWriter(max_pending=8, fmt="jpg", quality=90)
+    writer.submit(image, "out/a_processed.jpg")
+    writer.close()
+"""
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from size_stats import count, stage
+
+# 标注图片的编码格式
+IMAGE_FORMATS = ("jpg", "png", "webp")
+
+
+def encode_image(image, fmt="jpg", quality=None):
+    """
+    按格式编码图像
+
+    Args:
+        fmt: 见 IMAGE_FORMATS
+        quality: jpg/webp 质量 1~100，png 压缩级别 0~9；None 时使用 OpenCV 默认值
+    Returns:
+        编码后的 numpy 缓冲区，失败返回None
+    """
+    if fmt not in IMAGE_FORMATS:
+        raise ValueError(f"不支持的图片格式: {fmt}")
+    flags = []
+    if quality is not None:
+        flag = {"jpg": cv2.IMWRITE_JPEG_QUALITY, "png": cv2.IMWRITE_PNG_COMPRESSION,
+                "webp": cv2.IMWRITE_WEBP_QUALITY}[fmt]
+        flags = [flag, int(quality)]
+    ok, buffer = cv2.imencode("." + fmt, image, flags)
+    return buffer if ok else None
+
+def write_image(image, path, fmt="jpg", quality=None):
+    """编码并写入文件（支持中文路径），返回写入字节数，失败返回None"""
+    buffer = encode_image(image, fmt, quality)
+    if buffer is None:
+        return None
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(buffer.tobytes())
+    return len(buffer)
+
+
+class SyncImageWriter:
+    """同步写入（在调用线程中编码写盘），可序列化，用于进程池工作进程"""
+    def __init__(self, fmt="jpg", quality=None):
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {fmt}")
+        self.fmt = fmt
+        self.quality = quality
+
+    @property
+    def extension(self):
+        return "." + self.fmt
+
+    def submit(self, image, path):
+        try:
+            with stage("encode_write"):
+                size = write_image(image, path, self.fmt, self.quality)
+        except Exception as e:
+            print(f"保存图像时出错: {path}")
+            print(f"错误信息: {str(e)}")
+            return False
+        if size is not None:
+            count("bytes_written", size)
+        return size is not None
+
+    def close(self):
+        pass
+
+
+class ImageWriter:
+    """
+    有界队列 + 后台线程的图片写入器。
+
+    submit() 只把图像引用放入队列（调用方之后不得再修改该数组），队列满时阻塞，
+    阻塞时间累计在 wait_time 中，可据此判断写盘是否成为瓶颈。写入失败不会中断测量，
+    失败的路径记录在 failed 中，close() 时打印。
+    """
+    def __init__(self, max_pending=8, fmt="jpg", quality=None, threads=1):
+        if fmt not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {fmt}")
+        self.fmt = fmt
+        self.quality = quality
+        self.queue = queue.Queue(maxsize=max(1, max_pending))
+        self.lock = threading.Lock()
+        self.written = 0
+        self.bytes_written = 0
+        self.encode_time = 0.0
+        self.wait_time = 0.0
+        self.failed = []
+        self.threads = [threading.Thread(target=self._run, name=f"image-writer-{i}", daemon=True)
+                        for i in range(max(1, threads))]
+        for t in self.threads:
+            t.start()
+
+    @property
+    def extension(self):
+        return "." + self.fmt
+
+    def submit(self, image, path):
+        """加入写入队列；队列满时等待（背压），等待时间计入 write_queue 阶段"""
+        if not self.threads:
+            raise RuntimeError("ImageWriter 已关闭")
+        try:
+            self.queue.put_nowait((image, path))
+        except queue.Full:
+            start = time.perf_counter()
+            with stage("write_queue"):
+                self.queue.put((image, path))
+            self.wait_time += time.perf_counter() - start
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            image, path = item
+            start = time.perf_counter()
+            try:
+                size = write_image(image, path, self.fmt, self.quality)
+                error = None if size is not None else "编码失败"
+            except Exception as e:
+                size, error = None, str(e)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.encode_time += elapsed
+                if error is None:
+                    self.written += 1
+                    self.bytes_written += size
+                else:
+                    self.failed.append((path, error))
+
+    def close(self):
+        """等待队列中的图片全部写完并结束后台线程"""
+        if not self.threads:
+            return
+        for _ in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+        for path, error in self.failed:
+            print(f"保存图像时出错: {path}")
+            print(f"错误信息: {error}")
+
+    def add_to_stats(self, run_stats):
+        """
+        把后台线程的编码写入耗时和写入字节数计入 size_stats.RunStats 汇总（encode_write 阶段、bytes_written 计数），
+        与同步写入时的统计项一致。后台写入不在某张图片的计时范围内，每张图片的记录中没有这两项
+        """
+        run_stats.add_time("encode_write", self.encode_time)
+        run_stats.add_count("bytes_written", self.bytes_written)
+
+    def print_summary(self):
+        print(f"后台写入标注图片 {self.written} 张，{self.bytes_written / 1e6:.1f} MB，"
+              f"编码写入 {self.encode_time:.2f} 秒，队列满等待 {self.wait_time:.2f} 秒"
+              + (f"，失败 {len(self.failed)} 张" if self.failed else ""))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
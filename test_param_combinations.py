@@ -1,24 +1,17 @@
 import os
+import csv
 import cv2
 import numpy as np
-from scipy.spatial.distance import euclidean
-from imutils import perspective, contours
 import imutils
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from tqdm import tqdm  # 新增
 
-def save_image(image, save_path):
-    try:
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        is_success, buffer = cv2.imencode(".jpg", image)
-        if is_success:
-            with open(save_path, "wb") as f:
-                f.write(buffer.tobytes())
-        return is_success
-    except Exception as e:
-        print(f"保存图像时出错: {save_path}")
-        print(f"错误信息: {str(e)}")
-        return False
+from size_image_cache import ImageCache
+from size_object import (ImageMeasurement, MeasureParams, detect_edges, draw_measurements,
+                         filter_contours, measure_contours, save_overlay)
+from size_synthetic import dimension_errors, load_ground_truth, match_truth
+from size_writer import ImageWriter
 
 # 步进方式生成参数组合
 def range_step(start, stop, step):
@@ -43,7 +36,48 @@ area_thresholds = range_step(50, 300, 50)  # 50,100,150,200,250,300 共6种
 
 scale = 20.6  # 固定放大倍数
 
+# 标注输出格式："jpg" 烧录标注并保存图片；"json"/"svg" 只写几KB的矢量标注文件，查看时再叠加到原图
+overlay_format = "jpg"
+
+# 真值文件（size_synthetic.py 的 ground_truth.json 格式）：{"图片文件名": [{"width_mm": .., "height_mm": ..}, ...]}，
+# 尺寸为实际毫米数；本扫描按 mm_scale=scale 测量，评分时测得尺寸换算为毫米后再比较。
+# 有 center 时按中心点匹配，否则按尺寸最接近的对象匹配；参考物体可用 "reference": true 标出或不写。
+# 为 None 时只按有效识别数量排名
+ground_truth_file = None
+# 真值评分：每个真值零件漏检记 miss_penalty_mm，检测到时记其长短边平均绝对误差(mm)（不超过 miss_penalty_mm），
+# 每个没有对应真值的多余零件（噪声、背景轮廓）也记 miss_penalty_mm；score 为全部真值零件和多余零件的平均代价，
+# 越小越好，最大为 miss_penalty_mm（一个零件都没匹配上的组合），排在最后。
+# 只有尺寸没有 center 的真值按尺寸匹配，平均误差超过 miss_penalty_mm 的对象不算检测到
+miss_penalty_mm = 5.0
+# 排行榜每处理多少个工作单元重写一次，中途停止时已有可用的排名
+leaderboard_every = 20
+
+# 扫描过程中只记录数值指标，不保存任何标注图片；扫描结束后按排行榜排名，
+# 只为排名前 render_top_k 和后 render_bottom_k 的参数组合渲染标注图片
+render_top_k = 5
+render_bottom_k = 5
+# 只渲染这些图片（文件名），为空时渲染全部图片
+render_images = []
+
+# 解码缓存：解码后总大小不超过该值时BGR图像保存在内存，否则灰度图写入 cache_directory 并用 memmap 读取
+cache_memory_mb = 4096
+cache_directory = r"C:\Users\LHB\Pictures\Sweep_Cache"
+
+# 并行工作进程数：0 表示使用全部CPU核心，1 为单进程。
+# 工作单元为 (图片, 模糊核)，工作进程通过共享内存（或 memmap 缓存文件）读取解码后的图像，不复制；
+# 指标由主进程按图片顺序汇总写入
+sweep_workers = 0
+
 image_directory = r"C:\Users\LHB\Pictures\OCR_Captures"
+# 指标文件 sweep_metrics_{时间戳}.csv（每个组合每张图片一行）和排行榜 sweep_leaderboard_{时间戳}.csv
+results_directory = r"C:\Users\LHB\Pictures\OCR_Results"
+
+METRIC_COLUMNS = ["tag", "blur_ksize", "canny_low", "canny_high", "dilate_iter", "erode_iter", "min_area",
+                  "image", "status", "error", "objects", "main_width_mm", "main_height_mm", "pixel_per_cm",
+                  "matched", "expected", "false_positives", "mean_abs_error_mm", "max_abs_error_mm", "score"]
+LEADERBOARD_COLUMNS = ["rank", "tag", "blur_ksize", "canny_low", "canny_high", "dilate_iter", "erode_iter",
+                       "min_area", "images", "valid_count", "fail_count", "success_rate", "matched", "expected",
+                       "false_positives", "detection_rate", "mean_abs_error_mm", "max_abs_error_mm", "score"]
 
 # 统计所有参数组合总数和图片总数
 param_combos = [
@@ -54,128 +88,292 @@ param_combos = [
     for erode_iter in erode_iters
     for min_area in area_thresholds
 ]
-all_filenames = [fn for fn in os.listdir(image_directory) if fn.endswith(('.png', '.jpg', '.jpeg'))]
 
-total_combos = len(param_combos)
-for combo in tqdm(param_combos, desc="参数组合进度"):
+def param_tag(combo):
     blur_ksize, canny1, canny2, dilate_iter, erode_iter, min_area = combo
-    param_tag = f"b{blur_ksize[0]}x{blur_ksize[1]}_c{canny1}-{canny2}_d{dilate_iter}_e{erode_iter}_a{min_area}"
-    processed_dir = rf"C:\Users\LHB\Pictures\Processed_Images\process_{param_tag}"
-    results_directory = rf"C:\Users\LHB\Pictures\OCR_Results\result_{param_tag}"
-    processed_dir_false = rf"C:\Users\LHB\Pictures\Processed_Images_False\process_{param_tag}"
-    results_directory_false = rf"C:\Users\LHB\Pictures\OCR_Results_False\result_{param_tag}"
-    os.makedirs(processed_dir, exist_ok=True)
-    os.makedirs(results_directory, exist_ok=True)
-    os.makedirs(processed_dir_false, exist_ok=True)
-    os.makedirs(results_directory_false, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    result_file = os.path.join(results_directory, f"detection_results_{timestamp}.txt")
-    result_file_false = os.path.join(results_directory_false, f"detection_results_{timestamp}.txt")
-
-    valid_count = 0
-    fail_count = 0
-
-    with open(result_file, 'w', encoding='utf-8') as f, \
-         open(result_file_false, 'w', encoding='utf-8') as f_false:
-        for filename in tqdm(all_filenames, desc=f"{param_tag}", leave=False):
-            image_path = os.path.join(image_directory, filename)
-            try:
-                image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
-            except Exception as e:
-                print(f"读取图像时出错: {image_path}")
-                print(f"错误信息: {str(e)}")
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                processed_path = os.path.join(processed_dir_false, f"{base_name}_processed.jpg")
-                f_false.write(f"图像: {filename}\n")
-                f_false.write(f"处理后图片: {processed_path}\n")
-                f_false.write(f"异常: {str(e)}\n")
-                f_false.write("-" * 30 + "\n")
-                fail_count += 1
-                continue
-            if image is None:
-                print(f"无法读取图像: {image_path}")
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                processed_path = os.path.join(processed_dir_false, f"{base_name}_processed.jpg")
-                f_false.write(f"图像: {filename}\n")
-                f_false.write(f"处理后图片: {processed_path}\n")
-                f_false.write(f"异常: 无法读取图像\n")
-                f_false.write("-" * 30 + "\n")
-                fail_count += 1
-                continue
+    return f"b{blur_ksize[0]}x{blur_ksize[1]}_c{canny1}-{canny2}_d{dilate_iter}_e{erode_iter}_a{min_area}"
 
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            blur = cv2.GaussianBlur(gray, blur_ksize, 0)
-            edged = cv2.Canny(blur, canny1, canny2)
-            edged = cv2.dilate(edged, None, iterations=dilate_iter)
-            edged = cv2.erode(edged, None, iterations=erode_iter)
-            cnts = cv2.findContours(edged.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = imutils.grab_contours(cnts)
-            if len(cnts) == 0:
-                print(f"未找到有效轮廓: {image_path}")
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                processed_path = os.path.join(processed_dir_false, f"{base_name}_processed.jpg")
-                save_image(image, processed_path)
-                f_false.write(f"图像: {filename}\n")
-                f_false.write(f"处理后图片: {processed_path}\n")
-                f_false.write(f"异常: 未找到有效轮廓\n")
-                f_false.write("-" * 30 + "\n")
-                fail_count += 1
+def combo_dirs(tag):
+    """(标注图片, 失败标注图片) 文件夹"""
+    return (rf"C:\Users\LHB\Pictures\Processed_Images\process_{tag}",
+            rf"C:\Users\LHB\Pictures\Processed_Images_False\process_{tag}")
+
+def combo_params(combo):
+    blur_ksize, canny1, canny2, dilate_iter, erode_iter, min_area = combo
+    return MeasureParams(blur_ksize=blur_ksize[0], canny_low=canny1, canny_high=canny2,
+                         dilate_iter=dilate_iter, erode_iter=erode_iter, min_area=min_area, mm_scale=scale)
+
+def contour_stages(gray, blur_ksize):
+    """
+    同一模糊核下的阶段缓存：模糊一次，每组Canny阈值一次，膨胀/腐蚀按迭代次数逐次累加
+    （iterations=n 与连续做 n 次 3x3 运算结果相同），每个前缀只计算一次；
+    面积过滤之前的轮廓每个 (Canny, 膨胀, 腐蚀) 只提取一次。
+    依次产出 (canny1, canny2, dilate_iter, erode_iter, 轮廓列表)
+    """
+    blur = cv2.GaussianBlur(gray, blur_ksize, 0)
+    for canny1, canny2 in canny_params:
+        dilated = cv2.Canny(blur, canny1, canny2)
+        for d in range(1, max(dilate_iters) + 1):
+            dilated = cv2.dilate(dilated, None)
+            if d not in dilate_iters:
                 continue
-            (cnts, _) = contours.sort_contours(cnts)
-            cnts = [x for x in cnts if cv2.contourArea(x) > min_area]
+            eroded = dilated
+            for e in range(1, max(erode_iters) + 1):
+                eroded = cv2.erode(eroded, None)
+                if e not in erode_iters:
+                    continue
+                cnts = imutils.grab_contours(cv2.findContours(eroded, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+                yield canny1, canny2, d, e, cnts
+
+def measure_filtered(cnts, areas, image_size, combo):
+    """面积过滤后的轮廓测量为 ImageMeasurement，失败原因与逐组合测量一致"""
+    if len(cnts) == 0:
+        return ImageMeasurement(image_size=image_size, error="轮廓面积过滤后无有效轮廓")
+    # 最左侧轮廓为参考物体
+    records, pixel_per_cm = measure_contours(cnts, areas, image_size, combo_params(combo))
+    if pixel_per_cm is None:
+        return ImageMeasurement(image_size=image_size, error="参考物体尺寸为0")
+    return ImageMeasurement(image_size=image_size, pixel_per_cm=pixel_per_cm, records=records, reference=True)
+
+def measure_combo(image, combo):
+    """单个参数组合的完整测量（渲染阶段使用，结果与扫描中的阶段缓存路径相同）"""
+    image_size = image.shape[:2]
+    params = combo_params(combo)
+    cnts = imutils.grab_contours(cv2.findContours(detect_edges(image, params), cv2.RETR_EXTERNAL,
+                                                  cv2.CHAIN_APPROX_SIMPLE))
+    if len(cnts) == 0:
+        return ImageMeasurement(image_size=image_size, error="未找到有效轮廓")
+    cnts, areas = filter_contours(cnts, params.min_area)
+    return measure_filtered(cnts, areas, image_size, combo)
+
+def metric_row(result, truths=None):
+    """
+    测量结果转为数值指标：(error, 对象数, 主对象宽, 主对象高, 像素/cm, 匹配数, 真值数, 多余零件数, 绝对误差和,
+    最大绝对误差, 评分代价和)。主对象为参考物体右侧的第一个零件，只有参考物体时宽高为None；没有真值时后六项为None。
+    评分代价和见 miss_penalty_mm：真值零件和多余零件的代价之和，除以 (真值数 + 多余零件数) 即为该图片的评分
+    """
+    if truths is None:
+        score = (None, None, None, None, None, None)
+    else:
+        pairs = match_truth(result, truths, mm_scale=scale, max_size_error=miss_penalty_mm)
+        errors, matched, expected = dimension_errors(pairs, mm_scale=scale)
+        false_positives = (len(result.parts) if result.ok else 0) - matched
+        abs_err = np.abs(errors)
+        cost = (float(np.minimum(abs_err.mean(axis=1), miss_penalty_mm).sum())
+                + miss_penalty_mm * (expected - matched + false_positives))
+        score = (matched, expected, false_positives, float(abs_err.sum()),
+                 float(abs_err.max()) if abs_err.size else None, cost)
+    if not result.ok:
+        return (result.error, 0, None, None, None, *score)
+    parts = result.parts
+    width, height = ((round(float(parts[0]["width_mm"]), 3), round(float(parts[0]["height_mm"]), 3))
+                     if len(parts) else (None, None))
+    return (None, len(result.records), width, height, round(float(result.pixel_per_cm), 4), *score)
+
+# 工作进程中的图片缓存和真值（单进程时为主进程中的对象）
+_cache = None
+_truth = {}
+
+def _init_worker(handle, truth):
+    global _cache, _truth
+    _cache = ImageCache.attach(handle)
+    _truth = truth
+
+def sweep_unit(filename, blur_ksize):
+    """
+    一个工作单元：一张图片在一个模糊核下的全部参数组合，只计算数值指标
+
+    Returns:
+        [(组合, *metric_row)]，按 param_combos 中的顺序
+    """
+    truths = _truth.get(filename)
+    image = _cache.get(filename)
+    if image is None:
+        failed = metric_row(ImageMeasurement(image_size=(0, 0), error=_cache.error(filename)), truths)
+        return [(combo, *failed) for combo in param_combos if combo[0] == blur_ksize]
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image_size = image.shape[:2]
+    outcomes = []
+    for canny1, canny2, dilate_iter, erode_iter, cnts in contour_stages(gray, blur_ksize):
+        # 面积过滤前只算一次面积并排序；稳定排序下按更大阈值再筛选，顺序与直接过滤相同
+        base_cnts, base_areas = filter_contours(cnts, min(area_thresholds))
+        for min_area in area_thresholds:
+            combo = (blur_ksize, canny1, canny2, dilate_iter, erode_iter, min_area)
             if len(cnts) == 0:
-                print(f"未找到有效轮廓: {image_path}")
-                base_name = os.path.splitext(os.path.basename(image_path))[0]
-                processed_path = os.path.join(processed_dir_false, f"{base_name}_processed.jpg")
-                save_image(image, processed_path)
-                f_false.write(f"图像: {filename}\n")
-                f_false.write(f"处理后图片: {processed_path}\n")
-                f_false.write(f"异常: 轮廓面积过滤后无有效轮廓\n")
-                f_false.write("-" * 30 + "\n")
-                fail_count += 1
-                continue
+                result = ImageMeasurement(image_size=image_size, error="未找到有效轮廓")
+            else:
+                keep = np.flatnonzero(base_areas > min_area)
+                result = measure_filtered([base_cnts[i] for i in keep], base_areas[keep], image_size, combo)
+            outcomes.append((combo, *metric_row(result, truths)))
+    return outcomes
+
+class Leaderboard:
+    """
+    参数组合排行榜，逐个工作单元累加，随时可以排名和写出。
+    有真值时按 score（真值零件和多余零件的平均代价，见 miss_penalty_mm）从小到大排名，
+    否则按有效识别数量从高到低；相同时按 param_combos 顺序
+    """
+    def __init__(self, combos, use_truth):
+        self.use_truth = use_truth
+        self.order = {combo: i for i, combo in enumerate(combos)}
+        self.stats = {combo: {"images": 0, "valid_count": 0, "fail_count": 0, "matched": 0, "expected": 0,
+                              "false_positives": 0, "abs_error_sum": 0.0, "max_abs_error": None, "cost": 0.0} for combo in combos}
+
+    def add(self, combo, error, matched, expected, false_positives, abs_error_sum, max_abs_error, cost):
+        s = self.stats[combo]
+        s["images"] += 1
+        s["fail_count" if error else "valid_count"] += 1
+        if expected is not None:
+            s["matched"] += matched
+            s["expected"] += expected
+            s["false_positives"] += false_positives
+            s["abs_error_sum"] += abs_error_sum
+            s["cost"] += cost
+            if max_abs_error is not None:
+                s["max_abs_error"] = max(s["max_abs_error"] or 0.0, max_abs_error)
+
+    def row(self, combo):
+        """排行榜中的一行（不含名次）"""
+        s = self.stats[combo]
+        success = s["valid_count"] / s["images"] if s["images"] else 0.0
+        detection = s["matched"] / s["expected"] if s["expected"] else None
+        # 每个匹配零件有长边、短边两个误差
+        mean_err = s["abs_error_sum"] / (2 * s["matched"]) if s["matched"] else None
+        items = s["expected"] + s["false_positives"]
+        score = s["cost"] / items if items else None
+        def r(v, n):
+            return None if v is None else round(v, n)
+        return [param_tag(combo), combo[0][0], *combo[1:], s["images"], s["valid_count"], s["fail_count"],
+                round(success, 4), s["matched"], s["expected"], s["false_positives"], r(detection, 4), r(mean_err, 4),
+                r(s["max_abs_error"], 4), r(score, 4)]
+
+    def ranked(self):
+        if self.use_truth:
+            def key(combo):
+                row = self.row(combo)
+                return (row[-1] is None, row[-1] if row[-1] is not None else 0.0, self.order[combo])
+        else:
+            def key(combo):
+                return (-self.stats[combo]["valid_count"], self.order[combo])
+        return sorted(self.stats, key=key)
+
+    def write(self, path):
+        """写出完整排行榜（先写临时文件再替换，中途打开也不会读到半个文件）"""
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(LEADERBOARD_COLUMNS)
+            for rank, combo in enumerate(self.ranked(), 1):
+                writer.writerow([rank, *self.row(combo)])
+        os.replace(tmp, path)
+
+def render_combos(cache, combos, filenames):
+    """为选定的参数组合重新测量并保存标注图片（jpg 由后台线程编码写入）"""
+    image_writer = ImageWriter(fmt="jpg") if overlay_format == "jpg" else None
+    try:
+        for combo in tqdm(combos, desc="渲染标注图片"):
+            tag = param_tag(combo)
+            processed_dir, processed_dir_false = combo_dirs(tag)
+            for filename in filenames:
+                image = cache.get(filename)
+                if image is None:
+                    continue
+                result = measure_combo(image, combo)
+                base_name = os.path.splitext(filename)[0]
+                output_dir = processed_dir if result.ok else processed_dir_false
+                if image_writer is not None:
+                    image = cache.color(filename)
+                    image_writer.submit(draw_measurements(image, result) if result.ok else image,
+                                        os.path.join(output_dir, f"{base_name}_processed.jpg"))
+                else:
+                    save_overlay(result, os.path.join(image_directory, filename),
+                                 os.path.join(output_dir, f"{base_name}_processed.{overlay_format}"))
+            print(f"[{tag}] 标注图片已保存到: {processed_dir}")
+    finally:
+        if image_writer is not None:
+            image_writer.close()
+
+def main():
+    global _cache, _truth
+    all_filenames = [fn for fn in os.listdir(image_directory) if fn.endswith(('.png', '.jpg', '.jpeg'))]
+    if ground_truth_file:
+        _truth = load_ground_truth(ground_truth_file)
+        missing = [fn for fn in all_filenames if fn not in _truth]
+        print(f"真值文件: {ground_truth_file}，{len(all_filenames) - len(missing)} 张图片有真值"
+              + (f"，{len(missing)} 张没有真值（不参与误差评分）" if missing else ""))
+    # 每张图片只解码一次，所有参数组合共用
+    _cache = ImageCache([os.path.join(image_directory, fn) for fn in all_filenames],
+                        memory_limit=cache_memory_mb << 20, cache_dir=cache_directory,
+                        progress=lambda paths: tqdm(paths, desc="解码图片"))
+    print(f"已缓存 {len(_cache)} 张图片（{_cache.mode}，{_cache.nbytes / (1 << 20):.0f} MB）")
+    os.makedirs(results_directory, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    metrics_file = os.path.join(results_directory, f"sweep_metrics_{timestamp}.csv")
+    leaderboard_file = os.path.join(results_directory, f"sweep_leaderboard_{timestamp}.csv")
+    board = Leaderboard(param_combos, use_truth=bool(ground_truth_file))
+
+    workers = sweep_workers if sweep_workers > 0 else (os.cpu_count() or 1)
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(_cache.share(), _truth))
+    # 工作单元按 (图片, 模糊核) 顺序提交、按同样顺序返回：所有参数组合同步推进，
+    # 中途的排行榜是全部组合在前若干张图片上的比较
+    units = [(filename, blur_ksize) for filename in all_filenames for blur_ksize in blur_ksizes]
+    tags = {combo: param_tag(combo) for combo in param_combos}
+    interrupted = False
+    try:
+        if executor is not None:
+            chunksize = max(1, len(units) // (workers * 16))
+            results = executor.map(sweep_unit, [fn for fn, _ in units], [b for _, b in units], chunksize=chunksize)
+        else:
+            results = map(sweep_unit, [fn for fn, _ in units], [b for _, b in units])
+        with open(metrics_file, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(METRIC_COLUMNS)
+            progress = tqdm(zip(units, results), total=len(units), desc="参数扫描进度")
+            for n, ((filename, blur_ksize), outcomes) in enumerate(progress, 1):
+                for (combo, error, objects, width, height, pixel_per_cm,
+                     matched, expected, false_positives, err_sum, err_max, cost) in outcomes:
+                    board.add(combo, error, matched, expected, false_positives, err_sum, err_max, cost)
+                    mean_err = err_sum / (2 * matched) if matched else None
+                    items = expected + false_positives if expected is not None else 0
+                    score = cost / items if items else None
+                    writer.writerow([tags[combo], combo[0][0], *combo[1:], filename, "failed" if error else "ok",
+                                     error, objects, width, height, pixel_per_cm, matched, expected, false_positives,
+                                     None if mean_err is None else round(mean_err, 4),
+                                     None if err_max is None else round(err_max, 4),
+                                     None if score is None else round(score, 4)])
+                if n % leaderboard_every == 0:
+                    f.flush()
+                    board.write(leaderboard_file)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("扫描已中断，按已处理的图片输出排行榜")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    try:
+        board.write(leaderboard_file)
+        ranked = board.ranked()
+        print(f"指标已保存到: {metrics_file}")
+        print(f"排行榜已保存到: {leaderboard_file}")
+        for rank, combo in enumerate(ranked[:render_top_k], 1):
+            row = dict(zip(LEADERBOARD_COLUMNS[1:], board.row(combo)))
+            text = f"第 {rank} 名 [{tags[combo]}] 有效识别数量: {row['valid_count']}，失败数量: {row['fail_count']}"
+            if board.use_truth:
+                text += (f"，检出率: {row['detection_rate'] or 0:.1%}，平均误差: {row['mean_abs_error_mm']} mm，"
+                         f"评分: {row['score']}")
+            print(text)
+        # 前 k 名和后 k 名（去重），只渲染这些组合的标注图片
+        selected = ranked[:render_top_k] + ranked[max(render_top_k, len(ranked) - render_bottom_k):]
+        filenames = [fn for fn in all_filenames if fn in render_images] if render_images else all_filenames
+        if selected and filenames and not interrupted:
+            render_combos(_cache, selected, filenames)
+    finally:
+        _cache.close()
+    print(f"本次测试参数组合总数: {len(param_combos)}")
 
-            ref_object = cnts[0]
-            box = cv2.minAreaRect(ref_object)
-            box = cv2.boxPoints(box)
-            box = np.array(box, dtype="int")
-            box = perspective.order_points(box)
-            (tl, tr, br, bl) = box
-            dist_in_pixel = euclidean(tl, tr)
-            dist_in_cm = 2
-            pixel_per_cm = dist_in_pixel/dist_in_cm
-
-            for cnt in cnts:
-                box = cv2.minAreaRect(cnt)
-                box = cv2.boxPoints(box)
-                box = np.array(box, dtype="int")
-                box = perspective.order_points(box)
-                (tl, tr, br, bl) = box
-                cv2.drawContours(image, [box.astype("int")], -1, (0, 0, 255), 2)
-                mid_pt_horizontal = (tl[0] + int(abs(tr[0] - tl[0])/2), tl[1] + int(abs(tr[1] - tl[1])/2))
-                mid_pt_verticle = (tr[0] + int(abs(tr[0] - br[0])/2), tr[1] + int(abs(tr[1] - br[1])/2))
-                wid = euclidean(tl, tr)/pixel_per_cm
-                ht = euclidean(tr, br)/pixel_per_cm
-                wid_mm = wid * scale
-                ht_mm = ht * scale
-                cv2.putText(image, "{:.1f}mm".format(wid_mm), (int(mid_pt_horizontal[0] - 15), int(mid_pt_horizontal[1] - 10)), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
-                cv2.putText(image, "{:.1f}mm".format(ht_mm), (int(mid_pt_verticle[0] + 10), int(mid_pt_verticle[1])), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 2)
-
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
-            processed_path = os.path.join(processed_dir, f"{base_name}_processed.jpg")
-            save_image(image, processed_path)
-
-            f.write(f"图像: {filename}\n")
-            f.write(f"处理后图片: {processed_path}\n")
-            f.write(f"主对象宽度: {wid_mm:.1f} mm\n")
-            f.write(f"主对象高度: {ht_mm:.1f} mm\n")
-            f.write("-" * 30 + "\n")
-            print(f"[{param_tag}] 图像: {filename} 已处理并保存到 {processed_path}")
-            valid_count += 1
-
-    print(f"[{param_tag}] 结果已保存到: {result_file}")
-    print(f"[{param_tag}] 有效识别数量: {valid_count}，失败数量: {fail_count}")
-
-print(f"本次测试参数组合总数: {total_combos}")
+if __name__ == "__main__":
+    main()
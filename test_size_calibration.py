@@ -0,0 +1,73 @@
+"""
+治具ROI掩膜与镜头映射坐标换算测试（pytest）
+
+    python -m pytest -q test_size_calibration.py
+"""
+import cv2
+import numpy as np
+
+from size_calibration import FixtureROI, LensCalibration, corrected_to_raw
+
+
+def test_single_rect_has_no_mask():
+    bounds, mask = FixtureROI.from_rects([(100, 100, 400, 300)]).crop((1000, 1000))
+    assert bounds == (100, 100, 500, 400)
+    assert mask is None
+
+
+def test_overlapping_rects_keep_overlap():
+    bounds, mask = FixtureROI.from_rects([(100, 100, 400, 300), (300, 200, 400, 300)]).crop((1000, 1000))
+    assert bounds == (100, 100, 700, 500)
+    x0, y0 = bounds[:2]
+    # 重叠区域、各自独有区域在掩膜内，两个矩形都不覆盖的角落在掩膜外
+    assert mask[350 - y0, 350 - x0] == 255
+    assert mask[150 - y0, 150 - x0] == 255
+    assert mask[450 - y0, 650 - x0] == 255
+    assert mask[450 - y0, 150 - x0] == 0
+    assert mask[150 - y0, 650 - x0] == 0
+
+
+def test_polygon_inside_rect():
+    roi = FixtureROI([[(100, 100), (500, 100), (500, 400), (100, 400)],
+                      [(200, 200), (300, 150), (400, 250), (250, 350)]])
+    bounds, mask = roi.crop((1000, 1000))
+    assert bounds == (100, 100, 500, 400)
+    # 多边形完全位于矩形内，并集即为矩形
+    assert mask is None
+
+
+def test_crop_clipped_to_image():
+    bounds, mask = FixtureROI.from_rects([(-50, -50, 200, 200), (600, 600, 600, 600)]).crop((800, 1000))
+    assert bounds == (0, 0, 1000, 800)
+    assert mask.shape == (800, 1000)
+    assert mask[10, 10] == 255 and mask[700, 700] == 255 and mask[10, 700] == 0
+
+
+def make_lens(w=640, h=480):
+    camera_matrix = np.array([[500.0, 0, w / 2], [0, 500.0, h / 2], [0, 0, 1]])
+    dist_coeffs = np.array([-0.25, 0.08, 0.001, -0.001, 0.0])
+    homography = np.array([[1.02, 0.03, -8.0], [-0.02, 0.99, 5.0], [1e-5, -2e-5, 1.0]])
+    map1, map2 = cv2.initUndistortRectifyMap(camera_matrix, dist_coeffs, np.eye(3), homography @ camera_matrix,
+                                             (w, h), cv2.CV_16SC2)
+    return LensCalibration(camera_matrix, dist_coeffs, homography, (h, w), 0.0, map1, map2)
+
+
+def test_corrected_to_raw_inverts_remap():
+    lens = make_lens()
+    for raw_pt in [(100, 80), (320, 240), (550, 400)]:
+        raw = np.zeros((480, 640), np.float32)
+        cv2.circle(raw, raw_pt, 3, 255, -1)
+        corrected = cv2.remap(raw, lens.map1, lens.map2, cv2.INTER_LINEAR)
+        m = cv2.moments(corrected)
+        center = (m["m10"] / m["m00"], m["m01"] / m["m00"])
+        # 校正图像中的点换算回原图，应回到画点的位置
+        assert np.allclose(corrected_to_raw(center, lens), raw_pt, atol=1.0)
+
+
+def test_corrected_to_raw_float_maps():
+    lens = make_lens()
+    map_x, map_y = cv2.convertMaps(lens.map1, lens.map2, cv2.CV_32FC1)
+    float_lens = LensCalibration(lens.camera_matrix, lens.dist_coeffs, lens.homography, lens.image_size, 0.0,
+                                 map_x, map_y)
+    pts = np.array([[[10, 20], [300, 200], [630, 470], [320, 5]]])
+    assert np.allclose(corrected_to_raw(pts, lens), corrected_to_raw(pts, float_lens), atol=1e-6)
@@ -0,0 +1,76 @@
+"""
+轮廓提取和角点排序各条加速路径与整图处理、逐个调用的一致性测试（pytest）
+
+    python -m pytest -q test_size_contours.py
+"""
+from dataclasses import replace
+
+import cv2
+import numpy as np
+import pytest
+
+from imutils import perspective
+
+from size_object import find_contours, order_boxes, rects_to_boxes, tiled_canny
+from size_synthetic import SceneSpec, make_synthetic_scene, truth_params
+
+# 干净背景 / 纹理背景（大量细小、断续的弱边缘，Canny 滞后阈值的连接跨越很远）
+SCENES = {
+    "clean": SceneSpec(noise_sigma=4),
+    "textured": SceneSpec(noise_sigma=4, texture=25, texture_mm=0.5),
+    "fine_texture": SceneSpec(noise_sigma=4, texture=12, texture_mm=0.2),
+}
+
+
+def contour_keys(cnts):
+    return sorted((cv2.boundingRect(c), len(c), c.tobytes()) for c in cnts)
+
+
+@pytest.fixture(scope="module", params=[(name, seed) for name in SCENES for seed in range(2)],
+                ids=lambda p: f"{p[0]}-{p[1]}")
+def scene(request):
+    name, seed = request.param
+    image, _ = make_synthetic_scene(1280, 960, SCENES[name], seed=seed)
+    return image
+
+
+@pytest.mark.parametrize("tile", [8, 97, 256])
+def test_tiled_canny_matches_full_image(scene, tile):
+    params = truth_params()
+    gray = cv2.cvtColor(scene, cv2.COLOR_BGR2GRAY)
+    blur = cv2.GaussianBlur(gray, (params.blur_ksize, params.blur_ksize), 0)
+    expected = cv2.Canny(blur, params.canny_low, params.canny_high) > 0
+    edges = np.unpackbits(tiled_canny(scene, params, tile), axis=1, count=scene.shape[1]).astype(bool)
+    assert np.array_equal(edges, expected)
+
+
+@pytest.mark.parametrize("tile", [97, 200, 256])
+def test_tiled_contours_match_full_image(scene, tile):
+    params = truth_params()
+    expected, expected_areas = find_contours(scene, params)
+    cnts, areas = find_contours(scene, replace(params, tile_size=tile))
+    assert contour_keys(cnts) == contour_keys(expected)
+    assert np.allclose(np.sort(areas), np.sort(expected_areas))
+
+
+def test_tiled_contours_accept_gray_input(scene):
+    params = truth_params()
+    gray = cv2.cvtColor(scene, cv2.COLOR_BGR2GRAY)
+    expected, _ = find_contours(gray, params)
+    cnts, _ = find_contours(gray, replace(params, tile_size=200))
+    assert contour_keys(cnts) == contour_keys(expected)
+
+
+def test_box_ordering_matches_boxpoints(scene):
+    params = truth_params()
+    cnts, _ = find_contours(scene, params)
+    rng = np.random.default_rng(0)
+    # 测得的轮廓外加随机矩形，覆盖 0°/90° 等边界角度和小数坐标
+    rects = [cv2.minAreaRect(c) for c in cnts]
+    rects += [((float(x), float(y)), (float(w), float(h)), float(a)) for x, y, w, h, a in
+              zip(rng.uniform(0, 1000, 200), rng.uniform(0, 1000, 200), rng.uniform(1, 300, 200),
+                  rng.uniform(1, 300, 200), rng.choice([0, 45, 90, -90, rng.uniform(-90, 90)], 200))]
+    expected = np.array([perspective.order_points(cv2.boxPoints(r).astype("int")) for r in rects])
+    arr = np.array([(cx, cy, w, h, a) for (cx, cy), (w, h), a in rects], dtype=np.float64)
+    boxes = order_boxes(rects_to_boxes(arr))
+    assert np.array_equal(boxes, expected.astype(boxes.dtype))
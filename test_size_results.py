@@ -0,0 +1,135 @@
+"""
+结果写入与断点续跑清单测试（pytest）
+
+    python -m pytest -q test_size_results.py
+"""
+import os
+from collections import Counter
+from dataclasses import replace
+
+import cv2
+import numpy as np
+import pytest
+
+import size_results
+from size_object import MEASUREMENT_DTYPE, ImageMeasurement, process_directory
+from size_results import RESULT_COLUMNS, RunManifest, load_results, open_result_writer
+from size_synthetic import SceneSpec, make_synthetic_scene, truth_params
+
+
+def measurement(widths, reference=True):
+    records = np.zeros(len(widths), dtype=MEASUREMENT_DTYPE)
+    records["index"] = np.arange(len(widths))
+    records["width_mm"] = widths
+    records["height_mm"] = widths
+    return ImageMeasurement(image_size=(100, 100), pixel_per_cm=10.0, records=records, reference=reference)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl", "parquet"])
+def test_reference_column(tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    writer = open_result_writer(str(tmp_path / "results"), fmt)
+    writer.write("a.jpg", None, measurement([41.2, 12.0, 15.0]))
+    writer.write("b.jpg", None, measurement([12.0, 15.0], reference=False))
+    writer.write("c.jpg", None, ImageMeasurement(image_size=(100, 100), error="未找到有效轮廓"))
+    writer.close()
+    columns = load_results(writer.path)
+    assert columns["reference"].tolist() == [True, False, False, False, False, False]
+    assert columns["width_mm"][~columns["reference"]][:4].tolist() == [12.0, 15.0, 12.0, 15.0]
+
+
+def test_csv_refuses_to_append_to_old_header(tmp_path):
+    path = tmp_path / "results.csv"
+    old = [name for name in RESULT_COLUMNS if name != "reference"]
+    path.write_text(",".join(old) + "\n", encoding="utf-8-sig")
+    with pytest.raises(ValueError):
+        open_result_writer(os.path.splitext(str(path))[0], "csv")
+
+
+def write_scenes(directory, seeds):
+    os.makedirs(directory, exist_ok=True)
+    for name, seed in seeds.items():
+        image, _ = make_synthetic_scene(640, 480, SceneSpec(noise_sigma=4), seed=seed)
+        cv2.imwrite(os.path.join(directory, name), image)
+
+
+def resume_run(tmp_path, params=None):
+    """断点续跑一次，返回各图片在结果文件中的累计行数；没有需要处理的图片时返回None"""
+    path = process_directory(str(tmp_path / "images"), str(tmp_path / "processed"), str(tmp_path / "results"),
+                             params=params or truth_params(), annotate="none", result_format="csv", resume=True)
+    if path is None:
+        return None
+    return Counter(load_results(path)["image"].tolist())
+
+
+def test_resume_skips_unchanged_images(tmp_path):
+    write_scenes(tmp_path / "images", {"a.png": 0, "b.png": 1})
+    first = resume_run(tmp_path)
+    assert set(first) == {"a.png", "b.png"}
+    assert resume_run(tmp_path) is None
+
+
+def test_resume_remeasures_changed_content(tmp_path):
+    write_scenes(tmp_path / "images", {"a.png": 0, "b.png": 1})
+    first = resume_run(tmp_path)
+    write_scenes(tmp_path / "images", {"b.png": 2})
+    second = resume_run(tmp_path)
+    assert second["a.png"] == first["a.png"]
+    assert second["b.png"] > first["b.png"]
+
+
+def test_resume_fingerprint_change_invalidates(tmp_path):
+    write_scenes(tmp_path / "images", {"a.png": 0, "b.png": 1})
+    first = resume_run(tmp_path)
+    second = resume_run(tmp_path, replace(truth_params(), min_area=truth_params().min_area + 1))
+    assert second == first + first
+    assert resume_run(tmp_path, replace(truth_params(), min_area=truth_params().min_area + 1)) is None
+
+
+def test_resume_unreadable_image_fails_once_after_retries(tmp_path):
+    write_scenes(tmp_path / "images", {"a.png": 0})
+    (tmp_path / "images" / "bad.png").write_bytes(b"not an image")
+    retries = RunManifest("unused").max_read_retries
+    for _ in range(retries - 1):
+        assert "bad.png" not in resume_run(tmp_path)
+    counts = resume_run(tmp_path)
+    assert counts["bad.png"] == 1
+    columns = load_results(str(tmp_path / "results" / "detection_results.csv"))
+    bad = columns["image"] == "bad.png"
+    assert columns["status"][bad].tolist() == ["failed"]
+    assert columns["error"][bad].tolist() == ["无法读取图像"]
+    assert resume_run(tmp_path) is None
+
+
+def test_manifest_reuses_cached_hash(tmp_path, monkeypatch):
+    write_scenes(tmp_path / "images", {"a.png": 0})
+    image_path = str(tmp_path / "images" / "a.png")
+    manifest = RunManifest(str(tmp_path / "manifest.jsonl"))
+    manifest.add(image_path, "f0", True)
+    manifest.flush()
+    # 大小和修改时间未变时不重新计算哈希
+    monkeypatch.setattr(size_results, "file_hash", lambda path: pytest.fail("重新计算了哈希"))
+    reloaded = RunManifest(str(tmp_path / "manifest.jsonl"))
+    assert reloaded.is_done(image_path, "f0")
+    assert not reloaded.is_done(image_path, "f1")
+    # 修改时间变化但内容相同：重新计算哈希后仍视为已处理
+    monkeypatch.undo()
+    st = os.stat(image_path)
+    os.utime(image_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert RunManifest(str(tmp_path / "manifest.jsonl")).is_done(image_path, "f0")
+
+
+def test_manifest_prune_keeps_present_current_files(tmp_path):
+    write_scenes(tmp_path / "images", {"a.png": 0, "b.png": 1})
+    a, b = (str(tmp_path / "images" / name) for name in ("a.png", "b.png"))
+    manifest = RunManifest(str(tmp_path / "manifest.jsonl"))
+    manifest.add(a, "f0", True)
+    manifest.add(b, "f0", True)
+    # a.png 被覆盖为新内容，b.png 移出目录
+    write_scenes(tmp_path / "images", {"a.png": 2})
+    assert not manifest.is_done(a, "f0")
+    os.remove(b)
+    manifest.prune({"a.png"})
+    assert manifest.done == set()
+    assert set(manifest.stat_cache) == {"a.png"}
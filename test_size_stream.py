@@ -0,0 +1,103 @@
+"""
+视频流零件跟踪测试（pytest）
+
+    python -m pytest -q test_size_stream.py
+"""
+import cv2
+import numpy as np
+import pytest
+
+from size_calibration import CalibrationProfile
+from size_object import MEASUREMENT_DTYPE, MeasureParams
+from size_stream import PartTracker, measure_stream
+from size_synthetic import make_conveyor_video
+
+FRAME_SIZE = (960, 1280)
+
+
+def part_records(*centers, size=60):
+    """以给定中心为中心的正方形零件测量记录"""
+    records = np.zeros(len(centers), dtype=MEASUREMENT_DTYPE)
+    for i, (cx, cy) in enumerate(centers):
+        half = size // 2
+        records[i] = (i, 20.0, 10.0, 0.0, 1.0,
+                      [(cx - half, cy - half), (cx + half, cy - half), (cx + half, cy + half), (cx - half, cy + half)])
+    return records
+
+
+def test_track_survives_missed_frames():
+    tracker = PartTracker(max_distance=80, max_missed=5, min_hits=1)
+    finished = []
+    # 60 像素/帧匀速移动，第3、4帧漏检
+    for frame in range(10):
+        records = part_records((100 + 60 * frame, 400)) if frame not in (3, 4) else part_records()
+        finished += tracker.update(frame, records, FRAME_SIZE)
+    finished += tracker.flush()
+    assert len(finished) == 1
+    track = finished[0]
+    assert (track.first_frame, track.last_frame, track.hits) == (0, 9, 8)
+    assert np.allclose(track.velocity, (60, 0))
+
+
+def test_missed_frames_do_not_inflate_velocity():
+    tracker = PartTracker(max_distance=80, min_hits=1)
+    tracker.update(0, part_records((100, 400)), FRAME_SIZE)
+    tracker.update(1, part_records((160, 400)), FRAME_SIZE)
+    tracker.update(2, part_records(), FRAME_SIZE)
+    tracker.update(3, part_records(), FRAME_SIZE)
+    tracker.update(4, part_records((340, 400)), FRAME_SIZE)
+    assert len(tracker.tracks) == 1
+    assert np.allclose(tracker.tracks[0].velocity, (60, 0))
+
+
+def test_track_gap_is_per_track():
+    tracker = PartTracker(max_distance=80, min_hits=1)
+    # 零件A每帧都检测到，零件B在第2、3帧漏检；两者都应保持一条轨迹
+    for frame in range(8):
+        centers = [(100 + 50 * frame, 200)]
+        if frame not in (2, 3):
+            centers.append((100 + 70 * frame, 700))
+        tracker.update(frame, part_records(*centers), FRAME_SIZE)
+    assert len(tracker.tracks) == 2
+    assert tracker.next_id == 2
+
+
+def test_predicted_regions_follow_velocity():
+    tracker = PartTracker(max_distance=80)
+    tracker.update(0, part_records((100, 400)), FRAME_SIZE)
+    assert tracker.predicted_regions(1, FRAME_SIZE) == [(0, 290, 211, 511)]
+    tracker.update(1, part_records((160, 400)), FRAME_SIZE)
+    # 速度60像素/帧，预测2帧后的区域
+    assert tracker.predicted_regions(3, FRAME_SIZE) == [(170, 290, 391, 511)]
+    # 刚出现、还没有完整测量框的轨迹需要整帧检测
+    tracker.update(4, part_records((1270, 100)), FRAME_SIZE)
+    assert tracker.predicted_regions(5, FRAME_SIZE) is None
+
+
+@pytest.fixture(scope="module")
+def conveyor(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("video") / "conveyor.avi")
+    truths, pixel_per_cm = make_conveyor_video(path, frames=90, width=640, height=480, seed=0)
+    profile = CalibrationProfile("conveyor", pixel_per_cm, 10, (480, 640), 2)
+    return path, truths, profile
+
+
+def run_stream(path, profile, full_every):
+    parts = []
+    capture = cv2.VideoCapture(path)
+    try:
+        measure_stream(capture, MeasureParams(), profile, tracker=PartTracker(),
+                       on_part=lambda track, result: parts.append(result.records[0]), full_every=full_every)
+    finally:
+        capture.release()
+    return parts
+
+
+def test_region_detection_matches_full_frame(conveyor):
+    path, truths, profile = conveyor
+    full = run_stream(path, profile, 1)
+    regions = run_stream(path, profile, 5)
+    assert len(full) == len(regions) > 0
+    for a, b in zip(full, regions):
+        assert abs(a["width_mm"] - b["width_mm"]) < 0.2
+        assert abs(a["height_mm"] - b["height_mm"]) < 0.2
@@ -0,0 +1,59 @@
+"""
+合成真值匹配与参数扫描评分测试（pytest）
+
+    python -m pytest -q test_size_synthetic.py
+"""
+import numpy as np
+
+import test_param_combinations as sweep
+from size_object import MEASUREMENT_DTYPE, ImageMeasurement
+from size_synthetic import dimension_errors, match_truth
+
+# 只有尺寸、没有 center 的真值（实拍图片的写法）
+TRUTHS = [{"width_mm": 30.0, "height_mm": 20.0}, {"width_mm": 12.0, "height_mm": 8.0}]
+
+
+def measurement(sizes, mm_scale=10):
+    """第一个为参考物体，sizes 为实际毫米数，按 mm_scale 换算为测量输出"""
+    records = np.zeros(len(sizes) + 1, dtype=MEASUREMENT_DTYPE)
+    records["width_mm"][0] = records["height_mm"][0] = 2 * mm_scale
+    for i, (w, h) in enumerate(sizes, 1):
+        records[i]["width_mm"] = w * mm_scale / 10
+        records[i]["height_mm"] = h * mm_scale / 10
+    return ImageMeasurement(image_size=(960, 1280), pixel_per_cm=50.0, records=records, reference=True)
+
+
+def test_size_match_within_tolerance():
+    pairs = match_truth(measurement([(12.2, 8.1), (29.8, 20.3)]), TRUTHS, max_size_error=5.0)
+    errors, matched, expected = dimension_errors(pairs)
+    assert (matched, expected) == (2, 2)
+    assert np.abs(errors).max() < 0.5
+
+
+def test_size_match_rejects_noise_and_background():
+    # 1.5mm 噪声和 300mm 背景轮廓不能算作检测到
+    pairs = match_truth(measurement([(1.5, 1.0), (300.0, 200.0)]), TRUTHS, max_size_error=5.0)
+    assert [rec is None for _, rec in pairs] == [True, True]
+    # 不限制时仍取最接近的对象（兼容旧行为）
+    pairs = match_truth(measurement([(1.5, 1.0), (300.0, 200.0)]), TRUTHS)
+    assert all(rec is not None for _, rec in pairs)
+
+
+def test_size_match_converts_mm_scale():
+    pairs = match_truth(measurement([(30.0, 20.0)], mm_scale=20.6), TRUTHS, mm_scale=20.6, max_size_error=1.0)
+    errors, matched, _ = dimension_errors(pairs, mm_scale=20.6)
+    assert matched == 1
+    assert np.allclose(errors, 0)
+
+
+def test_sweep_score_penalises_false_positives():
+    clean = sweep.metric_row(measurement([(30.0, 20.0), (12.0, 8.0)], sweep.scale), TRUTHS)
+    noisy = sweep.metric_row(measurement([(30.0, 20.0), (12.0, 8.0), (1.5, 1.0), (2.0, 1.0)], sweep.scale), TRUTHS)
+    nothing = sweep.metric_row(ImageMeasurement(image_size=(960, 1280), error="未找到有效轮廓"), TRUTHS)
+    combos = sweep.param_combos[:3]
+    board = sweep.Leaderboard(combos, use_truth=True)
+    for combo, row in zip(combos, (nothing, noisy, clean)):
+        board.add(combo, row[0], *row[5:])
+    assert noisy[7] == 2 and clean[7] == 0
+    # 一个零件都没匹配上的组合排在最后
+    assert board.ranked() == [combos[2], combos[1], combos[0]]